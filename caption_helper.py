@@ -35,24 +35,83 @@ someone get started on writing a figure caption.'''
 # the kalasiris library (and ISIS) to get some additional information.
 
 import argparse
+import csv
 import datetime
+import functools
+import hashlib
+import json
 import math
 import os
+import sqlite3
 import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 import pvl
 
+import isisversion
+import readlabel
+
+default_cache = Path(
+    os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')
+) / 'scriptorium' / 'campt.sqlite'
+
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument('cube', help='Cube file(s) to read.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of cubes to read at once, in separate '
+                             'processes.  Default is the number of CPUs.')
+    parser.add_argument('-f', '--format', choices=('text', 'jsonl', 'csv'),
+                        default='text',
+                        help='Output format, with one record per cube for '
+                             'jsonl and csv.  Default: %(default)s')
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                        default=sys.stdout,
+                        help='File to write to.  Default is standard output.')
+    parser.add_argument('-c', '--cache', type=Path, default=default_cache,
+                        help='File to keep campt results in, so that campt '
+                             'is only run again if a cube or its SPICE '
+                             'kernels change.  Default: %(default)s')
+    parser.add_argument('--cache-size', type=float, default=64,
+                        help='The most MiB of campt results to keep, after '
+                             'which the least recently used are dropped. '
+                             'Default: %(default)s')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always run campt, and do not cache results.')
+    parser.add_argument('cube', nargs='+', help='Cube file(s) to read.')
 
     args = parser.parse_args()
 
+    if args.no_cache:
+        caption_cube = caption
+    else:
+        caption_cube = functools.partial(
+            caption, cache=args.cache,
+            cache_bytes=int(args.cache_size * 2 ** 20)
+        )
+
+    if len(args.cube) == 1 or args.jobs == 1:
+        results = map(caption_cube, args.cube)
+        errors = write_records(args.cube, results, args.format, args.output)
+    else:
+        # Each cube's campt run pays for an ISIS start-up, so run many at
+        # once.  Executor.map() yields the results in the input order.
+        with ProcessPoolExecutor(args.jobs) as executor:
+            results = executor.map(caption_cube, args.cube)
+            errors = write_records(
+                args.cube, results, args.format, args.output
+            )
+
+    return 1 if errors else None
+
+
+def get_elements(cube: os.PathLike, cache=None) -> dict:
     # Gather data elements into elem:
     elem = dict()
-    label = pvl.load(args.cube)['IsisCube']
+    label = readlabel.read_label(cube)['IsisCube']
 
     elem.update(get_instrument(label.get('Instrument')))
 
@@ -62,15 +121,80 @@ def main():
 
     elem.update(get_mapping(label.get('Mapping')))
 
-    elem.update(get_campt(args.cube))
+    elem.update(get_campt(cube, label.get('Kernels'), cache))
 
-    # Print out results.
-    for k in elem.keys():
-        print('{}: {}'.format(k, elem.get(k)))
-    print('')
-    print(' '.join(get_sentences(elem)))
+    return elem
 
-    return
+
+def caption(cube: os.PathLike, cache=None, cache_bytes=64 * 2 ** 20) -> tuple:
+    """Returns a two-tuple of the elements dict and the list of sentences
+    for the *cube*, or of None and the error message if it couldn't be
+    read.  If *cache* is a path, campt results are kept in a CamptCache
+    there of up to *cache_bytes*."""
+    try:
+        if cache is None:
+            elem = get_elements(cube)
+        else:
+            with CamptCache(cache, cache_bytes) as campt_cache:
+                elem = get_elements(cube, campt_cache)
+    except Exception as err:
+        return None, f'{type(err).__name__}: {err}'
+    return elem, get_sentences(elem)
+
+
+# The order of the elements in jsonl and csv records.
+elements = ('scname', 'instrument', 'time', 'productid', 'pixelres',
+            'projection', 'northaz', 'subsolargroundaz', 'abovehoriz')
+
+
+def plain(value):
+    # Values with units, like pvl.Units, become "value units" strings, so
+    # that records can be written as JSON or CSV.
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if hasattr(value, 'units'):
+        return f'{value.value} {value.units}'
+    return str(value)
+
+
+def write_records(cubes, results, fmt, out):
+    """Writes the (elem, sentences) *results* of caption() for each of the
+    *cubes* to the file object *out* in the *fmt* format, and returns the
+    number of cubes that couldn't be read."""
+    columns = ('cube',) + elements + ('caption', 'error')
+    if fmt == 'csv':
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+
+    errors = 0
+
+    for i, (cube, (elem, sentences)) in enumerate(zip(cubes, results)):
+        if elem is None:
+            print(f'{cube}: {sentences}', file=sys.stderr)
+            errors += 1
+            record = dict(cube=str(cube), error=sentences)
+        else:
+            record = dict(cube=str(cube))
+            record.update((k, plain(elem.get(k))) for k in elements)
+            record['caption'] = ' '.join(sentences)
+
+        if fmt == 'jsonl':
+            out.write(json.dumps(record) + '\n')
+        elif fmt == 'csv':
+            writer.writerow([record.get(k) for k in columns])
+        elif elem is not None:
+            # Print out results.
+            if len(cubes) > 1:
+                if i > 0:
+                    print('', file=out)
+                print(f'{cube}:', file=out)
+            for k in elem.keys():
+                print('{}: {}'.format(k, elem.get(k)), file=out)
+            print('', file=out)
+            print(' '.join(sentences), file=out)
+        out.flush()
+
+    return errors
 
 
 def get_instrument(label: dict) -> dict:
@@ -105,27 +229,123 @@ def get_mapping(label: dict) -> dict:
     return d
 
 
-def get_campt(path: os.PathLike) -> dict:
-    d = dict(northaz=None, subsolargroundaz=None, abovehoriz=None)
-
+class CamptCache:
+    """An on-disk SQLite store of campt GroundPoint results, which drops
+    the least recently used results once they take up more than
+    *max_bytes*.  It can be shared by several processes at once."""
+
+    def __init__(self, path: os.PathLike, max_bytes=64 * 2 ** 20):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS campt ('
+                        'key TEXT PRIMARY KEY, value TEXT, '
+                        'size INTEGER, used REAL)')
+
+    @staticmethod
+    def key(path: os.PathLike, kernels=None) -> str:
+        # campt's answer only depends on the cube and its SPICE, so a
+        # result is good as long as the file and its Kernels group are
+        # the same.
+        st = os.stat(path)
+        if kernels is None:
+            ktext = ''
+        else:
+            ktext = pvl.dumps(pvl.PVLModule(Kernels=kernels),
+                              encoder=pvl.encoder.ISISEncoder())
+        parts = [os.path.abspath(path), st.st_size, st.st_mtime_ns, ktext]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key: str):
+        with self.db:
+            row = self.db.execute('SELECT value FROM campt WHERE key = ?',
+                                  (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE campt SET used = ? WHERE key = ?',
+                            (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, value: str):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO campt VALUES (?, ?, ?, ?)',
+                            (key, value, len(value) + len(key), time.time()))
+            total = self.db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM campt').fetchone()[0]
+            if total > self.max_bytes:
+                evict = list()
+                for k, size in self.db.execute(
+                        'SELECT key, size FROM campt ORDER BY used'):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((k,))
+                    total -= size
+                self.db.executemany('DELETE FROM campt WHERE key = ?', evict)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def campt_groundpoint(path: os.PathLike, kernels=None, cache=None):
+    """Returns the GroundPoint group that campt reports for the cube at
+    *path*, or None if campt couldn't get one.  If a CamptCache is given
+    as *cache*, a result for the same cube and *kernels* is taken from it
+    instead of running campt, and new results are added to it.  Failed
+    campt runs are not cached, since the reason they failed (like
+    missing SPICE) may not last."""
+    if cache is not None:
+        key = cache.key(path, kernels)
+        text = cache.get(key)
+        # An empty result is a failure cached by an earlier version of
+        # this, so campt is tried again.
+        if text:
+            return pvl.loads(text)['GroundPoint']
+
+    import kalasiris as isis
     try:
-        import kalasiris as isis
         cpvl = pvl.loads(isis.campt(path).stdout)['GroundPoint']
+        # The ISIS encoder keeps the case of the keywords.
+        text = pvl.dumps(pvl.PVLModule(GroundPoint=cpvl),
+                         encoder=pvl.encoder.ISISEncoder())
+    except subprocess.CalledProcessError:
+        return None
 
-        d['northaz'] = cpvl.get('NorthAzimuth')
-        d['subsolargroundaz'] = cpvl.get('SubSolarGroundAzimuth')
+    if cache is not None:
+        cache.put(key, text)
+    return cpvl
 
-        incid = cpvl.get('Incidence')
-        if incid is not None:
-            d['abovehoriz'] = pvl.Units(str(90 - float(incid[0])), incid[1])
 
-    except subprocess.CalledProcessError:
-        # Couln't get any data from campt, maybe it was a level 2 image?
-        pass
+def get_campt(path: os.PathLike, kernels=None, cache=None) -> dict:
+    d = dict(northaz=None, subsolargroundaz=None, abovehoriz=None)
+
+    if isisversion.probe().program('campt') is None:
+        # Without ISIS, there's no campt to run.
+        return d
+
+    try:
+        cpvl = campt_groundpoint(path, kernels, cache)
     except ModuleNotFoundError:
         # To get some additional functionality,
         # install the kalasiris library.
-        pass
+        return d
+
+    if cpvl is None:
+        # Couln't get any data from campt, maybe it was a level 2 image?
+        return d
+
+    d['northaz'] = cpvl.get('NorthAzimuth')
+    d['subsolargroundaz'] = cpvl.get('SubSolarGroundAzimuth')
+
+    incid = cpvl.get('Incidence')
+    if incid is not None:
+        d['abovehoriz'] = pvl.Units(str(90 - float(incid[0])), incid[1])
 
     return d
 
@@ -27,9 +27,11 @@ import subprocess
 import sys
 from pathlib import Path
 
+import isisversion
 
-def crop(fr, to, samp, line, nsamp, nline):
-    cmd = ('crop', f'from= {fr}', f'to= {to}',
+
+def crop(fr, to, samp, line, nsamp, nline, program='crop'):
+    cmd = (program, f'from= {fr}', f'to= {to}',
            f'samp= {samp}', f'line= {line}',
            f'nsamp= {nsamp}', f'nline= {nline}')
     return subprocess.run(cmd, check=True,
@@ -59,6 +61,11 @@ def main():
 
     args = parser.parse_args()
 
+    crop_path = isisversion.probe().program('crop')
+    if crop_path is None:
+        parser.error('Could not find the ISIS crop program.  '
+                     'Is $ISISROOT set?')
+
     for cub in args.cube:
         in_p = Path(cub)
         if(args.output):
@@ -68,7 +75,7 @@ def main():
 
         (samp, line, nsamp, nline) = calcoffset(args.first, args.second)
 
-        print(crop(in_p, out_p, samp, line, nsamp, nline).args)
+        print(crop(in_p, out_p, samp, line, nsamp, nline, crop_path).args)
 
         if(args.output):
             # If there's a specific output filename, only do one.
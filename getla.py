@@ -25,14 +25,40 @@ altimeter data."""
 # code we wrote for LOLA.
 
 import argparse
+import collections
+import contextlib
+import http.client
+import math
 import os
 import json
+import re
+import shutil
 import subprocess
 import sys
-import urllib.request
+import tempfile
+import threading
+import time
+import urllib.error
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse, urlunparse
+
+gds_url = 'http://oderest.rsl.wustl.edu/livegds'
+
+# The GDS query string and the string in the name of the result file
+# that we want for each kind of data.
+queries = dict(
+    MOLA=('?output=JSON&query=molapedr&results=v&', '_topo_csv.csv'),
+    # Simple topography per row (Lon, Lat, Topo (m above datum)
+    # LOLA=('?output=JSON&query=lolardr&results=u&', '_topo_simple_csv.csv'),
+    # Topography per row
+    LOLA=('?output=JSON&query=lolardr&results=t&', '_topo_csv.csv'),
+)
+
+default_cache = Path(
+    os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')
+) / 'scriptorium' / 'getla'
 
 
 def arg_parser():
@@ -49,19 +75,290 @@ def arg_parser():
         action="store_true",
         help="Get MOLA data."
     )
+    parser.add_argument(
+        "-o", "--output",
+        type=Path,
+        help="The name of the CSV file to write, which will have a PDS3 "
+             "label of the same name with a .lbl suffix.  Default is to "
+             "name it after the data and the bounding box."
+    )
+    parser.add_argument(
+        "-c", "--cache",
+        type=Path,
+        default=default_cache,
+        help="Directory where the data for each tile of the bounding box "
+             "is kept, so that only tiles that have not been retrieved "
+             "before are queried.  Default: %(default)s"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Make a single query for the bounding box and download the "
+             "resulting files, without using the tile cache."
+    )
+    parser.add_argument(
+        "-t", "--tile",
+        type=float,
+        default=1.0,
+        help="The size, in degrees, of the square latitude/longitude tiles "
+             "that are cached.  Default: %(default)s"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=4,
+        help="The number of queries and downloads to run at once. "
+             "Default: %(default)s"
+    )
+    parser.add_argument(
+        "-a", "--archive",
+        type=Path,
+        help="Read the points from this directory of local PDS3 point "
+             "tables (see pointarchive.py), instead of querying the GDS."
+    )
+    parser.add_argument(
+        "--npy",
+        action="store_true",
+        help="Also convert the CSV file to a spatially sorted .npy file "
+             "with topo2npy.py, for fast reading of subsets of it."
+    )
+    parser.add_argument(
+        "-g", "--grid",
+        type=float,
+        metavar="RES",
+        help="Also grid the points into a GeoTIFF DEM over the bounding box, "
+             "with pixels of this many degrees, with points2dem.py."
+    )
+    parser.add_argument(
+        "--stat",
+        choices=("mean", "median", "min", "max", "count"),
+        default="mean",
+        help="How --grid combines the points in a pixel. "
+             "Default: %(default)s"
+    )
+    parser.add_argument(
+        "--fill",
+        type=float,
+        default=0,
+        help="Have --grid fill empty pixels from the nearest pixel with "
+             "points within this many pixels."
+    )
+    parser.add_argument(
+        "--url",
+        default=gds_url,
+        help="The URL of the GDS REST interface.  Default: %(default)s"
+    )
+    parser.add_argument(
+        "-b", "--batch",
+        type=Path,
+        help="A file with a W/E/S/N string on each line, optionally "
+             "followed by a site name, to retrieve data for each of them. "
+             "Overlapping sites share GDS queries, and each site's CSV file "
+             "is named for the site (or its bounding box)."
+    )
+    parser.add_argument(
+        "-d", "--directory",
+        type=Path,
+        default=Path("."),
+        help="Directory to write the CSV files for --batch sites to. "
+             "Default: %(default)s"
+    )
     parser.add_argument(
         "boundingbox",
+        nargs="?",
         help="A W/E/S/N string"
     )
     return parser
 
 
-def retrieve_file(
-    minlat, maxlat, minlon, maxlon, which, pad=0.1, output=None
-):
-    """Retrieves MOLA or LOLA data from the WUSTL REST web interface,
-    http://oderest.rsl.wustl.edu/ ."""
+class Session:
+    """A pool of keep-alive HTTP and HTTPS connections which can be shared
+    between threads, so that every request to a host after the first
+    reuses an open connection if one is idle.
+
+    :ivar timings: A list of (URL, bytes, seconds) for each download.
+    """
+
+    redirects = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout=300, max_redirects=5):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.timings = list()
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, key):
+        # Returns a two-tuple of a connection to the (scheme, host) key
+        # and whether it is one that has been used before.
+        with self._lock:
+            if self._idle[key]:
+                return self._idle[key].pop(), True
+        if key[0] == "https":
+            return http.client.HTTPSConnection(key[1], timeout=self.timeout), False
+        return http.client.HTTPConnection(key[1], timeout=self.timeout), False
+
+    def _request(self, key, path, headers):
+        conn, reused = self._connect(key)
+        try:
+            conn.request("GET", path, headers=headers)
+            return conn, conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            conn.close()
+            if not reused:
+                raise
+        # The server closed an idle connection, so the other idle ones
+        # to this host are likely stale, too.
+        with self._lock:
+            for idle in self._idle.pop(key, []):
+                idle.close()
+        conn, _ = self._connect(key)
+        conn.request("GET", path, headers=headers)
+        return conn, conn.getresponse()
+
+    def _release(self, key, conn, response):
+        if response.isclosed() and not response.will_close:
+            with self._lock:
+                self._idle[key].append(conn)
+        else:
+            conn.close()
+
+    @contextlib.contextmanager
+    def get(self, url, headers=None):
+        """A context manager which yields the http.client.HTTPResponse of a
+        GET request for *url*, following redirects.  Raises
+        urllib.error.HTTPError for error statuses."""
+        for _ in range(self.max_redirects + 1):
+            parsed = urlparse(url)
+            key = (parsed.scheme, parsed.netloc)
+            path = urlunparse(("", "", parsed.path or "/", parsed.params,
+                               parsed.query, ""))
+            conn, response = self._request(key, path, headers or dict())
+            try:
+                if response.status in self.redirects:
+                    response.read()
+                    url = urljoin(url, response.getheader("Location"))
+                    continue
+                if response.status >= 400:
+                    response.read()
+                    raise urllib.error.HTTPError(
+                        url, response.status, response.reason,
+                        response.headers, None
+                    )
+                yield response
+                return
+            finally:
+                self._release(key, conn, response)
+
+        raise urllib.error.URLError(f"Too many redirects for {url}")
+
+    def json(self, url):
+        """Returns the parsed JSON content from *url*."""
+        with self.get(url) as response:
+            return json.loads(response.read())
+
+    def download(self, url, path, retries=5, chunk_size=1024 * 1024):
+        """Downloads *url* to the file *path*, and reports the time it
+        took.
 
+        The content is streamed in chunks to a temporary path.part file,
+        which is renamed to *path* only once its size matches what the
+        server said it would be.  If the connection drops, the download
+        is resumed from where it left off with an HTTP Range request, up
+        to *retries* times.
+        """
+        path = Path(path)
+        part = path.with_name(path.name + ".part")
+        # A .part file from an earlier run may not be from this URL.
+        part.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else None
+            try:
+                with self.get(url, headers) as response:
+                    expected = self._expected_size(response, offset)
+                    if response.status != 206 and offset:
+                        # The server ignored the Range, so start over.
+                        offset = 0
+                    with open(part, "r+b" if offset else "wb") as f:
+                        f.seek(offset)
+                        while True:
+                            chunk = response.read(chunk_size)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                        f.truncate()
+                        size = f.tell()
+                if expected is None or size == expected:
+                    break
+                error = f"expected {expected} bytes, but got {size}"
+            except urllib.error.HTTPError as err:
+                if err.code == 416 and offset and offset == _total_size(
+                    err.headers.get("Content-Range")
+                ):
+                    # Already have all of it.
+                    size = offset
+                    break
+                raise
+            except (
+                http.client.IncompleteRead, http.client.RemoteDisconnected,
+                ConnectionError, TimeoutError
+            ) as err:
+                error = repr(err)
+
+            if attempt == retries:
+                raise ConnectionError(
+                    f"Could not download {url} after {retries} retries: {error}"
+                )
+            print(f"Resuming {path.name} ({error})")
+            time.sleep(min(2 ** attempt, 30))
+
+        os.replace(part, path)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.timings.append((url, size, elapsed))
+        print(f"Downloaded {Path(urlparse(url)[2]).name}: {size} bytes "
+              f"in {elapsed:.2f} s")
+        return path
+
+    @staticmethod
+    def _expected_size(response, offset):
+        # Returns the full size of the content, if the server said.
+        if response.status == 206:
+            return _total_size(response.getheader("Content-Range"))
+        length = response.getheader("Content-Length")
+        return None if length is None else int(length)
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _total_size(content_range):
+    # Returns the complete length from a Content-Range header value, like
+    # "bytes 100-199/1000" or "bytes */1000", or None if it is unknown.
+    if content_range is None:
+        return None
+    total = content_range.rpartition("/")[2].strip()
+    return int(total) if total.isdigit() else None
+
+
+def padded_box(minlat, maxlat, minlon, maxlon, pad=0.1):
+    """Returns a four-tuple of the minimum and maximum latitude, and the
+    western and eastern longitude of the box expanded by *pad* degrees on
+    every side, with longitudes in the range 0 to 360."""
     pminlat = float(minlat) - pad
     pmaxlat = float(maxlat) + pad
     pminlon = float(minlon) - pad
@@ -73,38 +370,35 @@ def retrieve_file(
     if pmaxlon < 0:
         pmaxlon += 360
 
-    # Build a query to the WUSTL REST interface for MOLA data
-    baseurl = 'http://oderest.rsl.wustl.edu/livegds'
-    if which is 'MOLA':
-        query = '?output=JSON&query=molapedr&results=v&'
-        filestring = '_topo_csv.csv'
-    elif which is 'LOLA':
-        # Simple topography per row (Lon, Lat, Topo (m above datum)
-        # query = '?output=JSON&query=lolardr&results=u&'
-        # filestring = '_topo_simple_csv.csv'
-
-        # Topography per row
-        query = '?output=JSON&query=lolardr&results=t&'
-        filestring = '_topo_csv.csv'
-    else:
+    return pminlat, pmaxlat, pminlon, pmaxlon
+
+
+def query_url(which, minlat, maxlat, westlon, eastlon, baseurl=gds_url):
+    """Returns the GDS query URL for *which* data in the box."""
+    try:
+        query = queries[which][0]
+    except KeyError:
         raise ValueError(f"Don't have a query for {which}")
 
     location_params = (
-        f"""minlat={pminlat}&maxlat={pmaxlat}&westlon={pminlon}&eastlon={pmaxlon}"""
+        f"""minlat={minlat}&maxlat={maxlat}&westlon={westlon}&eastlon={eastlon}"""
     )
+    return baseurl + query + location_params
 
-    if output and os.path.exists(output):
-        return True
-
-    queryurl = baseurl + query + location_params
-    # print queryUrl
 
+def gds_query(queryurl, session):
+    """Returns the list of ResultFile dicts from the GDS query."""
     # Parse the response
-    with urllib.request.urlopen(queryurl) as f:
-        r = json.load(f)
+    start = time.perf_counter()
+    r = session.json(queryurl)
+    print(f"GDS query took {time.perf_counter() - start:.2f} s")
+
+    return gds_results(r)
 
-    # print r
 
+def gds_results(r):
+    """Returns the list of ResultFile dicts from the parsed GDS JSON
+    response, *r*, or raises ValueError if the query failed."""
     if 'Success' not in r['GDSResults']['Status']:
         raise ValueError(r['GDSResults']['Error'])
     else:
@@ -113,30 +407,580 @@ def retrieve_file(
             r['GDSResults']['StateSummary']['StatusNote']
         )
 
-    # Find the link containing '_topo_csv.csv' and download it
+    try:
+        results = r['GDSResults']['ResultFiles']['ResultFile']
+    except (KeyError, TypeError):
+        # No points, so no files.
+        return list()
+
+    # A single result may not come wrapped in a list.
+    if isinstance(results, dict):
+        results = [results]
+    return results
 
-    found = False
-    for d in r['GDSResults']['ResultFiles']['ResultFile']:
+
+def result_urls(results, filestring):
+    """Returns a two-tuple of the URLs for the label and the data file of
+    the first of the *results* with *filestring* in its URL, or None."""
+    for d in results:
         if filestring in d['URL']:
             parsed = urlparse(d["URL"])
-            urlpath = Path(parsed[2])
-            lblpath = urlpath.with_suffix(".lbl")
             lblurlparts = list(parsed)
-            lblurlparts[2] = str(lblpath)
-            lblurl = urllib.parse.urlunparse(lblurlparts)
+            lblurlparts[2] = str(Path(parsed[2]).with_suffix(".lbl"))
+            return urlunparse(lblurlparts), d["URL"]
+    return None
+
+
+def retrieve_file(
+    minlat, maxlat, minlon, maxlon, which, pad=0.1, output=None,
+    baseurl=gds_url, session=None
+):
+    """Retrieves MOLA or LOLA data from the WUSTL REST web interface,
+    http://oderest.rsl.wustl.edu/ , and returns the path of the CSV file,
+    or None if the query did not result in one."""
+
+    pminlat, pmaxlat, pminlon, pmaxlon = padded_box(
+        minlat, maxlat, minlon, maxlon, pad
+    )
+
+    # Build a query to the WUSTL REST interface for MOLA data
+    queryurl = query_url(which, pminlat, pmaxlat, pminlon, pmaxlon, baseurl)
+
+    if output and os.path.exists(output):
+        return Path(output)
+
+    # print queryUrl
+
+    if session is None:
+        with Session() as session:
+            return retrieve_file(
+                minlat, maxlat, minlon, maxlon, which, pad, output,
+                baseurl, session
+            )
+
+    # Find the link containing '_topo_csv.csv' and download it
+    urls = result_urls(gds_query(queryurl, session), queries[which][1])
+    if urls is None:
+        return None
+
+    lblurl, csvurl = urls
+    if output:
+        csvpath = Path(output)
+        lblpath = csvpath.with_suffix(".lbl")
+    else:
+        csvpath = Path(Path(urlparse(csvurl)[2]).name)
+        lblpath = Path(Path(urlparse(lblurl)[2]).name)
+    with ThreadPoolExecutor(2) as executor:
+        for future in [
+            executor.submit(session.download, lblurl, lblpath),
+            executor.submit(session.download, csvurl, csvpath),
+        ]:
+            future.result()
+
+    # cmd = 'wget '
+    # if output:
+    #     cmd += f'--output-document={outputPath}'
+    # cmd += d['URL']
+    # print(cmd)
+    # os.system(cmd)
+    return csvpath
+
 
-            urllib.request.urlretrieve(lblurl, lblpath.name)
-            urllib.request.urlretrieve(d["URL"], urlpath.name)
+# The tile cache is laid out as cache/WHICH/SIZE/LAT_LON/, where LAT and
+# LON are the integer indices of the tile (so that the tile spans
+# LAT * SIZE to (LAT + 1) * SIZE degrees of latitude, and similarly for
+# longitude in the 0 to 360 range).  Each tile directory holds the
+# tile.lbl and tile.csv from the GDS, and a tile with no data has an
+# empty tile.csv and no label.  Tile directories are downloaded under a
+# temporary name and then renamed, so a tile directory that exists is
+# complete.
 
-            # cmd = 'wget '
-            # if output:
-            #     cmd += f'--output-document={outputPath}'
-            # cmd += d['URL']
-            # print(cmd)
-            # os.system(cmd)
-            return True
 
-    return found
+def tile_indices(minlat, maxlat, westlon, eastlon, size):
+    """Returns a list of the (lat, lon) indices of the tiles of *size*
+    degrees which cover the box.  If *westlon* is greater than
+    *eastlon*, the box crosses the 0/360 meridian."""
+    nlat = math.ceil(180 / size)
+    nlon = math.ceil(360 / size)
+    if eastlon < westlon:
+        eastlon += 360
+
+    lat_start = max(math.floor((minlat + 90) / size), 0)
+    lat_stop = min(math.ceil((maxlat + 90) / size), nlat)
+    lon_start = math.floor(westlon / size)
+    lon_stop = max(math.ceil(eastlon / size), lon_start + 1)
+
+    return [
+        (i, j % nlon)
+        for i in range(lat_start, lat_stop)
+        for j in range(lon_start, min(lon_stop, lon_start + nlon))
+    ]
+
+
+def tile_bounds(index, size):
+    """Returns the minimum and maximum latitude and the western and
+    eastern longitude of the tile with the (lat, lon) *index*."""
+    i, j = index
+    return (
+        max(i * size - 90, -90), min((i + 1) * size - 90, 90),
+        j * size, min((j + 1) * size, 360)
+    )
+
+
+def tile_dir(cache, which, size, index):
+    return Path(cache) / which / f"{size:g}" / f"{index[0]}_{index[1]}"
+
+
+def fetch_tile(cache, which, size, index, session, baseurl=gds_url):
+    """Queries the GDS for the tile and downloads its files into its
+    directory in the cache, returning that directory."""
+    tdir = tile_dir(cache, which, size, index)
+    tdir.parent.mkdir(parents=True, exist_ok=True)
+
+    urls = result_urls(
+        gds_query(
+            query_url(which, *tile_bounds(index, size), baseurl), session
+        ),
+        queries[which][1]
+    )
+
+    tmpdir = Path(tempfile.mkdtemp(dir=tdir.parent, prefix=".tmp"))
+    try:
+        if urls is None:
+            (tmpdir / "tile.csv").touch()
+        else:
+            session.download(urls[0], tmpdir / "tile.lbl")
+            session.download(urls[1], tmpdir / "tile.csv")
+        try:
+            os.rename(tmpdir, tdir)
+        except OSError:
+            # Another process already cached this tile.
+            shutil.rmtree(tmpdir)
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+
+    return tdir
+
+
+def lonlat_columns(header):
+    """Returns a two-tuple of the indices of the longitude and latitude
+    columns in the comma-separated *header* line."""
+    names = [n.strip().strip('"').casefold() for n in header.split(",")]
+    try:
+        lon = next(i for i, n in enumerate(names) if "lon" in n)
+        lat = next(i for i, n in enumerate(names) if "lat" in n)
+    except StopIteration:
+        raise ValueError(f"Could not find longitude and latitude in: {header}")
+    return lon, lat
+
+
+def in_box(lon, lat, box):
+    """Returns True if the point is in the (minlat, maxlat, westlon,
+    eastlon) *box*, which may cross the 0/360 meridian."""
+    minlat, maxlat, westlon, eastlon = box
+    return (
+        minlat <= lat <= maxlat and
+        (lon - westlon) % 360 <= (eastlon - westlon) % 360
+    )
+
+
+def relabel(text, csvname, rows):
+    """Returns the PDS3 label *text* of a GDS table, changed to describe
+    the file *csvname* with *rows* rows."""
+    old_rows = re.search(r"^\s*ROWS\s*=\s*(\d+)", text, re.MULTILINE)
+    if old_rows is not None:
+        file_records = re.search(
+            r"^(\s*FILE_RECORDS\s*=\s*)(\d+)", text, re.MULTILINE
+        )
+        if file_records is not None:
+            header = int(file_records.group(2)) - int(old_rows.group(1))
+            text = re.sub(
+                r"^(\s*FILE_RECORDS\s*=\s*)\d+",
+                lambda m: m.group(1) + str(rows + header),
+                text, flags=re.MULTILINE
+            )
+        text = re.sub(
+            r"^(\s*ROWS\s*=\s*)\d+",
+            lambda m: m.group(1) + str(rows),
+            text, flags=re.MULTILINE
+        )
+    return re.sub(
+        r'^(\s*\^\w+\s*=\s*\(?\s*")[^"]*(")',
+        lambda m: m.group(1) + csvname + m.group(2),
+        text, flags=re.MULTILINE
+    )
+
+
+def assemble(tdirs, box, size, output):
+    """Writes the points from the tile directories which fall within the
+    (minlat, maxlat, westlon, eastlon) *box* to the CSV file *output*,
+    along with a label, and returns the number of points written.  If
+    there are no points in the box, neither file is written."""
+    label = None
+    rows = 0
+    with open(output, "w", newline="") as out:
+        for tdir in tdirs:
+            i, j = (int(x) for x in tdir.name.split("_"))
+            last_lat = math.ceil(180 / size) - 1
+            with open(tdir / "tile.csv", newline="") as f:
+                header = f.readline()
+                if not header:
+                    continue
+                if label is None:
+                    out.write(header)
+                    lon_col, lat_col = lonlat_columns(header)
+                    label = (tdir / "tile.lbl").read_text()
+
+                for line in f:
+                    fields = line.split(",")
+                    lon = float(fields[lon_col]) % 360
+                    lat = float(fields[lat_col])
+                    # Points on a tile edge come back for both tiles, so
+                    # each point is only taken from the tile it is in.
+                    if (
+                        min(math.floor((lat + 90) / size), last_lat) == i and
+                        math.floor(lon / size) == j and
+                        in_box(lon, lat, box)
+                    ):
+                        out.write(line)
+                        rows += 1
+
+    if rows == 0:
+        # Like a GDS query that finds nothing, this leaves no file
+        # behind to be taken as the result of a later run.
+        os.remove(output)
+        return 0
+
+    Path(output).with_suffix(".lbl").write_text(
+        relabel(label, Path(output).name, rows)
+    )
+    return rows
+
+
+def retrieve_tiles(
+    minlat, maxlat, minlon, maxlon, which, pad=0.1, output=None,
+    cache=default_cache, size=1.0, baseurl=gds_url, jobs=4
+):
+    """Retrieves MOLA or LOLA data for the bounding box, only querying the
+    GDS for the tiles of *size* degrees that are not already in the
+    *cache* directory, and writes the points in the box to the CSV file
+    *output*, returning its path, or None if there are no points in the
+    box.
+
+    Up to *jobs* tiles are queried and downloaded at once, over a shared
+    pool of keep-alive connections.
+    """
+    if which not in queries:
+        raise ValueError(f"Don't have a query for {which}")
+
+    if output is None:
+        output = (
+            f"{which}_{minlon}_{maxlon}_{minlat}_{maxlat}{queries[which][1]}"
+        )
+
+    if os.path.exists(output):
+        return Path(output)
+
+    box = padded_box(minlat, maxlat, minlon, maxlon, pad)
+    indices = tile_indices(*box, size)
+    tdirs = [tile_dir(cache, which, size, index) for index in indices]
+    missing = [i for i, tdir in zip(indices, tdirs) if not tdir.exists()]
+    fetched = len(missing)
+    if missing:
+        with Session() as session, ThreadPoolExecutor(jobs) as executor:
+            list(executor.map(
+                lambda index: fetch_tile(
+                    cache, which, size, index, session, baseurl
+                ),
+                missing
+            ))
+
+    rows = assemble(tdirs, box, size, output)
+    if rows == 0:
+        print(
+            f"No points for {output} in {len(tdirs)} tiles, {fetched} of "
+            "which were queried."
+        )
+        return None
+    print(
+        f"Wrote {rows} points to {output} from {len(tdirs)} tiles, "
+        f"{fetched} of which were queried."
+    )
+    return Path(output)
+
+
+def retrieve_archive(
+    minlat, maxlat, minlon, maxlon, which, archive, pad=0.1, output=None,
+    update=True
+):
+    """Writes the points in the bounding box from the local archive of
+    point tables in the directory *archive* (see pointarchive.py) to the
+    CSV file *output*, along with a label, and returns its path.  The
+    *archive* may also be a pointarchive.Archive.  If *update* is True,
+    the archive's index is built first if it is out of date, otherwise
+    the index is used as it is."""
+    # Only this needs NumPy and pvl.
+    import pointarchive
+    import topo2npy
+
+    if output is None:
+        output = (
+            f"{which}_{minlon}_{maxlon}_{minlat}_{maxlat}{queries[which][1]}"
+        )
+
+    if os.path.exists(output):
+        return Path(output)
+
+    if not isinstance(archive, pointarchive.Archive):
+        archive = pointarchive.Archive(archive)
+    if update:
+        archive.update()
+
+    start = time.perf_counter()
+    points = archive.query(*padded_box(minlat, maxlat, minlon, maxlon, pad))
+    with open(output, "w", newline="") as f:
+        topo2npy.write_csv(points, f)
+    topo2npy.write_label(points, output)
+    print(
+        f"Wrote {len(points)} points to {output} from {archive.directory} "
+        f"in {time.perf_counter() - start:.3f} s"
+    )
+    return Path(output)
+
+
+def read_sites(path):
+    """Returns a list of (name, boundingbox) two-tuples from the file at
+    *path*, which has a W/E/S/N bounding box on each line, optionally
+    followed by whitespace and a name for the site.  Blank lines and
+    those starting with # are skipped, and the name is None if not
+    given."""
+    sites = list()
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            box, _, name = line.partition(" ")
+            if len(box.split("/")) != 4:
+                raise ValueError(f"Not a W/E/S/N bounding box: {line}")
+            sites.append((name.strip() or None, box))
+    return sites
+
+
+def _lon_union(a, b):
+    # Returns the (west, width) of the smallest longitude interval which
+    # covers the two (west, width) intervals, or None if they neither
+    # overlap nor abut.  Intervals may cross the 0/360 meridian.
+    eps = 1e-9
+    d_ab = (b[0] - a[0]) % 360
+    d_ba = (a[0] - b[0]) % 360
+    if d_ab > a[1] + eps and d_ba > b[1] + eps:
+        return None
+    candidates = (
+        (a[0], max(a[1], d_ab + b[1])),
+        (b[0], max(b[1], d_ba + a[1])),
+    )
+    west, width = min(candidates, key=lambda c: c[1])
+    return west, min(width, 360)
+
+
+def merge_boxes(boxes, max_growth=2.0):
+    """Returns a list of (box, members) two-tuples, where each box is the
+    union of the (minlat, maxlat, westlon, eastlon) *boxes* whose
+    indices are in the members list.  Boxes which overlap or abut are
+    merged, repeatedly, unless the merged box would have more than
+    *max_growth* times the area of the two boxes it replaces, so that a
+    chain of diagonally touching boxes isn't turned into one huge
+    query."""
+    merged = list()
+    for i, (minlat, maxlat, west, east) in enumerate(boxes):
+        width = (east - west) % 360 or (360 if east != west else 0)
+        merged.append(((minlat, maxlat, west, width), [i]))
+
+    def area(box):
+        return (box[1] - box[0]) * box[3]
+
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i][0], merged[j][0]
+                if a[0] > b[1] or b[0] > a[1]:
+                    continue
+                lon = _lon_union(a[2:], b[2:])
+                if lon is None:
+                    continue
+                union = (min(a[0], b[0]), max(a[1], b[1])) + lon
+                if area(union) > max_growth * (area(a) + area(b)):
+                    continue
+                merged[i] = (union, merged[i][1] + merged[j][1])
+                del merged[j]
+                changed = True
+                break
+            if changed:
+                break
+
+    results = list()
+    for (minlat, maxlat, west, width), members in merged:
+        east = west + width
+        if east > 360:
+            east -= 360
+        results.append(((minlat, maxlat, west, east), sorted(members)))
+    return results
+
+
+def split(csvpath, boxes, outputs):
+    """Writes the points of the GDS CSV file at *csvpath* which fall in
+    each of the (minlat, maxlat, westlon, eastlon) *boxes* to the
+    corresponding CSV file in *outputs*, along with a label made from the
+    label of *csvpath*, and returns a list of the number of points in
+    each.  No files are left for an output with no points."""
+    rows = [0] * len(outputs)
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(csvpath, newline=""))
+        header = f.readline()
+        lon_col, lat_col = lonlat_columns(header)
+        outs = [
+            stack.enter_context(open(output, "w", newline=""))
+            for output in outputs
+        ]
+        for out in outs:
+            out.write(header)
+
+        for line in f:
+            fields = line.split(",")
+            lon = float(fields[lon_col]) % 360
+            lat = float(fields[lat_col])
+            for k, box in enumerate(boxes):
+                if in_box(lon, lat, box):
+                    outs[k].write(line)
+                    rows[k] += 1
+
+    label = Path(csvpath).with_suffix(".lbl").read_text()
+    for output, n in zip(outputs, rows):
+        if n == 0:
+            os.remove(output)
+            continue
+        Path(output).with_suffix(".lbl").write_text(
+            relabel(label, Path(output).name, n)
+        )
+    return rows
+
+
+def retrieve_batch(
+    sites, which, pad=0.1, directory=".", cache=default_cache, size=1.0,
+    baseurl=gds_url, jobs=4, use_cache=True, archive=None
+):
+    """Retrieves MOLA or LOLA data for each of the (name, boundingbox)
+    *sites*, where the boundingbox is a W/E/S/N string, writing a CSV
+    file and label for each in *directory*, and returns a list of the
+    paths of the CSV files (None for a site without any data).
+
+    Sites whose padded boxes overlap are served by the same GDS queries:
+    with the tile cache, each tile needed by any site is queried once,
+    and without it, the padded boxes are merged with merge_boxes(), each
+    merged box is queried once, and its points are split back out to
+    the sites.  Up to *jobs* queries and downloads are run at once.
+
+    If *archive* is given, the points are read from that local archive
+    of point tables (or pointarchive.Archive) instead of the GDS (see
+    retrieve_archive()), and its index is brought up to date once for
+    all of the sites.
+    """
+    if which not in queries:
+        raise ValueError(f"Don't have a query for {which}")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    outputs = list()
+    boxes = list()
+    for name, boundingbox in sites:
+        minlon, maxlon, minlat, maxlat = boundingbox.split("/")
+        if name is None:
+            name = f"{which}_{minlon}_{maxlon}_{minlat}_{maxlat}"
+        outputs.append(directory / f"{name}{queries[which][1]}")
+        boxes.append(padded_box(minlat, maxlat, minlon, maxlon, pad))
+
+    if archive is not None:
+        import pointarchive
+
+        if not isinstance(archive, pointarchive.Archive):
+            archive = pointarchive.Archive(archive)
+        if not all(output.exists() for output in outputs):
+            # Once for the batch, rather than once for each site.
+            archive.update()
+        results = list()
+        for (name, boundingbox), output in zip(sites, outputs):
+            minlon, maxlon, minlat, maxlat = boundingbox.split("/")
+            results.append(retrieve_archive(
+                minlat, maxlat, minlon, maxlon, which, archive, pad, output,
+                update=False
+            ))
+        return results
+
+    todo = [k for k, output in enumerate(outputs) if not output.exists()]
+    results = [output if output.exists() else None for output in outputs]
+    if not todo:
+        return results
+
+    with Session() as session, ThreadPoolExecutor(jobs) as executor:
+        if use_cache:
+            indices = sorted(set(
+                index for k in todo for index in tile_indices(*boxes[k], size)
+            ))
+            missing = [
+                index for index in indices
+                if not tile_dir(cache, which, size, index).exists()
+            ]
+            list(executor.map(
+                lambda index: fetch_tile(
+                    cache, which, size, index, session, baseurl
+                ),
+                missing
+            ))
+            for k in todo:
+                tdirs = [
+                    tile_dir(cache, which, size, index)
+                    for index in tile_indices(*boxes[k], size)
+                ]
+                rows = assemble(tdirs, boxes[k], size, outputs[k])
+                if rows:
+                    print(f"Wrote {rows} points to {outputs[k]}")
+                    results[k] = outputs[k]
+                else:
+                    print(f"No points for {outputs[k]}")
+            queried = len(missing)
+        else:
+            merged = merge_boxes([boxes[k] for k in todo])
+            with tempfile.TemporaryDirectory(dir=directory) as tmp:
+                csvpaths = list(executor.map(
+                    lambda m: retrieve_file(
+                        *m[1][0], which, pad=0,
+                        output=Path(tmp) / f"{m[0]}{queries[which][1]}",
+                        baseurl=baseurl, session=session
+                    ),
+                    enumerate(merged)
+                ))
+                for (box, members), csvpath in zip(merged, csvpaths):
+                    if csvpath is None:
+                        continue
+                    ks = [todo[m] for m in members]
+                    rows = split(
+                        csvpath, [boxes[k] for k in ks],
+                        [outputs[k] for k in ks]
+                    )
+                    for k, n in zip(ks, rows):
+                        if n:
+                            print(f"Wrote {n} points to {outputs[k]}")
+                            results[k] = outputs[k]
+                        else:
+                            print(f"No points for {outputs[k]}")
+            queried = len(merged)
+
+    print(f"Retrieved {len(todo)} sites with {queried} GDS queries.")
+    return results
 
 
 # def getkey( cube, grpname, keyword ):
@@ -154,6 +998,9 @@ def main():
     if not (args.mola or args.lola):
         parser.error("Must either specify -m or -l")
 
+    if (args.boundingbox is None) == (args.batch is None):
+        parser.error("Must specify either a bounding box or -b")
+
     # if len(args.boundingbox) == 1:
         # assume it is GDAL-readable:
         #   try:
@@ -163,17 +1010,68 @@ def main():
         #   maxLon = getkey( args[0], 'Mapping', 'MaximumLongitude' )
         #   minLat = getkey( args[0], 'Mapping', 'MinimumLatitude' )
         #   maxLat = getkey( args[0], 'Mapping', 'MaximumLatitude' )
-    minlon, maxlon, minlat, maxlat = args.boundingbox.split("/")
+    if args.boundingbox is not None:
+        minlon, maxlon, minlat, maxlat = args.boundingbox.split("/")
     # else:
     #     parser.error(f"Couldn't get bounding box from {args.boundingbox}")
 
     if args.mola:
-        retrieve_file(minlat, maxlat, minlon, maxlon, 'MOLA')
+        which = 'MOLA'
     elif args.lola:
-        retrieve_file(minlat, maxlat, minlon, maxlon, 'LOLA')
+        which = 'LOLA'
     else:
         raise NotImplementedError("Shouldn't be able to get here.")
 
+    if args.batch is not None:
+        sites = read_sites(args.batch)
+        boxes = [boundingbox for name, boundingbox in sites]
+    else:
+        boxes = [args.boundingbox]
+
+    if args.batch is not None:
+        csvpaths = retrieve_batch(
+            sites, which, directory=args.directory,
+            cache=args.cache, size=args.tile, baseurl=args.url,
+            jobs=args.jobs, use_cache=not args.no_cache, archive=args.archive
+        )
+    elif args.archive is not None:
+        csvpaths = [retrieve_archive(
+            minlat, maxlat, minlon, maxlon, which, args.archive,
+            output=args.output
+        )]
+    elif args.no_cache:
+        csvpaths = [retrieve_file(
+            minlat, maxlat, minlon, maxlon, which,
+            output=args.output, baseurl=args.url
+        )]
+    else:
+        csvpaths = [retrieve_tiles(
+            minlat, maxlat, minlon, maxlon, which, output=args.output,
+            cache=args.cache, size=args.tile, baseurl=args.url,
+            jobs=args.jobs
+        )]
+
+    if args.npy:
+        # Only this needs NumPy and pvl.
+        import topo2npy
+        for csvpath in filter(None, csvpaths):
+            print(f"Wrote {topo2npy.convert(csvpath)}")
+
+    if args.grid is not None:
+        # Only this needs NumPy, pvl, and rasterio.
+        import points2dem
+        for csvpath, boundingbox in zip(csvpaths, boxes):
+            if csvpath is None:
+                continue
+            west, east, south, north = (
+                float(x) for x in boundingbox.split("/")
+            )
+            points2dem.grid_file(
+                csvpath, csvpath.with_suffix(".tif"),
+                (south, north, west, east), args.grid, stat=args.stat,
+                fill=args.fill, radius=points2dem.radii[which]
+            )
+
 
 if __name__ == "__main__":
     sys.exit(main())
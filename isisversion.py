@@ -15,7 +15,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os, argparse, re, sys, string
+import os, argparse, collections, functools, json, re, sys, string, tempfile
+
+# The version of ISIS, and where its programs are, are found once per
+# process by probe(), and are also kept on disk in disk_cache, so that
+# another process can find them without looking through the ISIS
+# installation again, as long as the ISISROOT and the times that its
+# directories and version file were last modified are the same.
+default_root = '/usr/local/isis3/isis/' # default spot to try
+
+disk_cache = os.path.join( os.environ.get( 'XDG_CACHE_HOME', os.path.join( os.path.expanduser('~'), '.cache' ) ),
+                           'scriptorium', 'isisprobe.json' )
 
 assert( sys.version_info >= (3,0) ) # Must be using Python 3.
 
@@ -59,13 +69,86 @@ def isisversionparse( version ):
     version_tuple = tuple( version_list )
     return version_tuple
 
+class ISISEnvironment( collections.namedtuple( 'ISISEnvironment', ['root', 'version', 'programs'] ) ):
+    """What was found about the ISIS installation at root: its version string
+    (or None), and a dictionary of the paths to the programs in its bin
+    directory, by name."""
+    __slots__ = ()
+
+    @property
+    def available( self ):
+        return self.version is not None and bool( self.programs )
+
+    def program( self, name ):
+        """Returns the path to the ISIS program name, or None if there isn't one."""
+        return self.programs.get( name )
+
+
+def probe():
+    """Returns the ISISEnvironment for the current $ISISROOT.  The first call
+    in a process looks in the installation (or the disk cache), and later
+    calls with the same $ISISROOT return the same ISISEnvironment."""
+    return _probe( os.environ.get( 'ISISROOT', default_root ) )
+
+
+def _stamp( root ):
+    stamp = []
+    for path in ( root, os.path.join(root, 'bin'), os.path.join(root, 'version'),
+                  os.path.join(root, 'inc', 'Constants.h') ):
+        try:               stamp.append( os.stat(path).st_mtime_ns )
+        except OSError:    stamp.append( None )
+    return stamp
+
+
+@functools.lru_cache( maxsize=None )
+def _probe( root ):
+    stamp = _stamp( root )
+    try:
+        with open( disk_cache ) as f: cached = json.load( f )
+    except ( OSError, ValueError ):
+        cached = {}
+    entry = cached.get( root )
+    if( entry is not None and entry['stamp'] == stamp ):
+        return ISISEnvironment( root, entry['version'], entry['programs'] )
+
+    try:               version = read_version( root )
+    except IVError:    version = None
+
+    programs = {}
+    try:
+        with os.scandir( os.path.join(root, 'bin') ) as entries:
+            for e in entries:
+                if( e.is_file() and os.access( e.path, os.X_OK ) ): programs[e.name] = e.path
+    except OSError:
+        pass
+
+    cached[root] = dict( stamp=stamp, version=version, programs=programs )
+    try:
+        os.makedirs( os.path.dirname(disk_cache), exist_ok=True )
+        # Written to a temporary file and moved into place, so that other
+        # processes never read a partly written cache.
+        ( fd, tmp ) = tempfile.mkstemp( dir=os.path.dirname(disk_cache) )
+        with os.fdopen( fd, 'w' ) as f: json.dump( cached, f )
+        os.replace( tmp, disk_cache )
+    except OSError:
+        pass
+
+    return ISISEnvironment( root, version, programs )
+
+
 def isisversion(verbose=False):
-    path = '/usr/local/isis3/isis/' # default spot to try
-    try:               path = os.environ['ISISROOT']
-    except KeyError:   pass
+    env = probe()
+    version = env.version
+    if( version is None ):
+        # Look again, so that the reason it can't be found is raised.
+        version = read_version( env.root )
+
+    if( verbose ): print("\tFound Isis Version: "+version+ " at "+env.root)
+    return isisversionparse( version )
+
 
-    # if( verbose ): print path
-    
+def read_version( path ):
+    """Returns the version string of the ISIS installation at path."""
     version = None
     if os.path.exists( path+'/version' ):
         v = open( path+"/version", 'r')
@@ -83,12 +166,9 @@ def isisversion(verbose=False):
         f.close()
     else: raise VersionFileNotFoundError( "Could not find a file that might have a version string.  Is $ISISROOT set?" )
 
-    if( version ):
-        if( verbose ): print("\tFound Isis Version: "+version+ " at "+path)
-        return isisversionparse( version )
+    if( version ): return version
 
-    raise VersionNotFoundError( "Could not find a version string in " + f.str() )
-    return False
+    raise VersionNotFoundError( "Could not find a version string in " + path )
 	
 
 #----------------------------
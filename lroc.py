@@ -15,6 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import re
 
 lroc_targets = dict(M="Moon", E="Earth", C="Calibration", S="Star")
@@ -41,6 +42,18 @@ obsid_re = re.compile(
     fr"(?P<product>{prod_re.pattern})"
 
 )
+observation_re = re.compile(
+    fr"(?P<target>{target_re.pattern})"
+    fr"(?P<met>{met_re.pattern})"
+)
+
+
+# An LROCID is kept as a single integer key, which packs its parts so that
+# comparing keys compares the (target, met, instrument, product) tuples:
+# the target character above a 64-bit MET, above the instrument and
+# product characters, a byte each.
+_met_bits = 64
+_met_mask = (1 << _met_bits) - 1
 
 
 class LROCID:
@@ -54,53 +67,405 @@ class LROCID:
         (U)V only WAC, or (V)isible only WAC.
     "ivar product: A single character denoting an (E)DR product or
         (C)DR product.
+    :ivar key: The integer that the above are packed into, which orders
+        and hashes LROCIDs.
+
+    LROCIDs are immutable, hashable, and ordered by target, met,
+    instrument, and then product.
     """
 
+    __slots__ = ("_key",)
+
     def __init__(self, arg):
 
+        if isinstance(arg, LROCID):
+            self._key = arg._key
+            return
+
         match = obsid_re.search(str(arg))
         if match:
             parsed = match.groupdict()
-            self.target = parsed["target"]
-            self.met = int(parsed["met"])
-            self.instrument = parsed["instrument"]
-            self.product = parsed["product"]
+            met = int(parsed["met"])
+            if met >> _met_bits:
+                raise ValueError(f"The MET of {arg} is too large.")
+            self._key = (
+                ord(parsed["target"]) << (_met_bits + 16)
+                | met << 16
+                | ord(parsed["instrument"]) << 8
+                | ord(parsed["product"])
+            )
         else:
             raise ValueError(
                 f"{arg} did not match regex: {obsid_re.pattern}"
             )
 
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def target(self):
+        return chr(self._key >> (_met_bits + 16))
+
+    @property
+    def met(self):
+        return (self._key >> 16) & _met_mask
+
+    @property
+    def instrument(self):
+        return chr((self._key >> 8) & 0xFF)
+
+    @property
+    def product(self):
+        return chr(self._key & 0xFF)
+
     def __str__(self):
-        return f"{self.target}{str(self.met)}{self.instrument}{self.product}"
+        k = self._key
+        return (
+            f"{chr(k >> (_met_bits + 16))}{(k >> 16) & _met_mask}"
+            f"{chr((k >> 8) & 0xFF)}{chr(k & 0xFF)}"
+        )
 
     def __repr__(self):
         return f"{self.__class__.__name__}('{self.__str__()}')"
 
+    def __hash__(self):
+        return hash(self._key)
+
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return (
-                self.target == other.target
-                and self.met == other.met
-                and self.instrument == other.instrument
-                and self.product == other.product
-            )
+        if isinstance(other, LROCID):
+            return self._key == other._key
         return False
 
     def __lt__(self, other):
-        if isinstance(other, self.__class__):
-            return (
-                self.target,
-                self.met,
-                self.instrument,
-                self.product
-            ) < (
-                other.target,
-                other.met,
-                other.instrument,
-                other.product
-            )
-        else:
-            return NotImplemented
+        if isinstance(other, LROCID):
+            return self._key < other._key
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, LROCID):
+            return self._key <= other._key
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, LROCID):
+            return self._key > other._key
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, LROCID):
+            return self._key >= other._key
+        return NotImplemented
+
+    def __reduce__(self):
+        return (self.__class__, (str(self),))
 
     def observation(self):
         return f"{self.target}{str(self.met)}"
+
+
+# lrocid() has two levels of cache: one for the strings it is given, like
+# the names of the many files derived from a product, and one for the
+# product IDs matched in them, so that every string with the same ID in
+# it gets the same LROCID.  Each keeps up to this many of the most
+# recently used.
+lrocid_cache_size = 2 ** 16
+
+
+def lrocid(arg):
+    """Returns an LROCID for *arg*, like LROCID(*arg*) does, but from a
+    cache, so that repeating a string is a dictionary lookup, and all of
+    the strings with the same product ID in them return the same LROCID
+    object.  See lrocid_cache_info() for how well the cache is doing."""
+    if isinstance(arg, LROCID):
+        return arg
+    return _lrocid_of_string(str(arg))
+
+
+@functools.lru_cache(maxsize=lrocid_cache_size)
+def _lrocid_of_string(s):
+    match = obsid_re.search(s)
+    if match is None:
+        raise ValueError(f"{s} did not match regex: {obsid_re.pattern}")
+    return _lrocid_of_product(match.group())
+
+
+@functools.lru_cache(maxsize=lrocid_cache_size)
+def _lrocid_of_product(product_id):
+    return LROCID(product_id)
+
+
+def lrocid_cache_info():
+    """Returns a tuple of the functools CacheInfo, with its hits, misses,
+    maxsize and currsize, for lrocid()'s cache of the strings it has been
+    given, and for its cache of the product IDs found in them."""
+    return _lrocid_of_string.cache_info(), _lrocid_of_product.cache_info()
+
+
+def lrocid_cache_clear():
+    """Empties lrocid()'s caches, and resets their statistics."""
+    _lrocid_of_string.cache_clear()
+    _lrocid_of_product.cache_clear()
+
+
+# The fields of the structured arrays that parse_ids() returns.
+id_dtype = [
+    ("target", "U1"),
+    ("met", "i8"),
+    ("instrument", "U1"),
+    ("product", "U1"),
+]
+
+
+def _char_table(chars):
+    import numpy as np
+
+    table = np.zeros(256, dtype=bool)
+    table[[ord(c) for c in chars]] = True
+    return table
+
+
+def parse_ids(ids):
+    """Returns a NumPy structured array of the parts of each of the LROC
+    product IDs in *ids*, with the fields of id_dtype, and a boolean
+    array that is True where the ID was valid.  The parts of invalid IDs
+    are left as empty strings and zeros, and no exception is raised for
+    them, so ``ids[~valid]`` are the ones that could not be parsed.
+
+    The *ids* may be any iterable of strings or bytes, like a list, a
+    NumPy string array, or a column from an index table.  An ID is
+    valid if creating an LROCID from it would work (and its MET fits in
+    an int64).
+    """
+    import numpy as np
+
+    if not hasattr(ids, "__array__") and not isinstance(ids, (list, tuple)):
+        ids = list(ids)
+    a = np.asarray(ids)
+    if a.dtype.kind not in "SU":
+        a = a.astype(str)
+    a = np.ascontiguousarray(a.reshape(-1))
+
+    out = np.zeros(len(a), dtype=id_dtype)
+    valid = np.zeros(len(a), dtype=bool)
+    if len(a) == 0:
+        return out, valid
+
+    # The fast way: view the strings as a 2D array of character codes,
+    # and handle all of the IDs that are exactly one target character,
+    # nine to eighteen digits, an instrument and a product character,
+    # with nothing else but padding (spaces, quotes or NULs) around them.
+    codes = a.view(np.uint8 if a.dtype.kind == "S" else np.uint32)
+    codes = codes.reshape(len(a), -1)
+    width = codes.shape[1]
+    chars = np.array([chr(i) for i in range(256)])
+    targets = _char_table(lroc_targets.keys())
+    instruments = _char_table(lroc_inst.keys())
+    products = _char_table(lroc_prod.keys())
+
+    text = (codes != 0) & (codes != 32) & (codes != 34)
+    start = text.argmax(axis=1)
+    end = width - text[:, ::-1].argmax(axis=1)
+    digits = end - start - 3
+    candidate = text.any(axis=1) & (digits >= 9) & (digits <= 18)
+
+    spans = start * (width + 1) + end
+    zero = codes.dtype.type(ord("0"))
+    for span in np.unique(spans[candidate]):
+        rows = np.flatnonzero(candidate & (spans == span))
+        (s, e) = divmod(int(span), width + 1)
+        sub = codes[:, s:e] if len(rows) == len(a) else codes[rows, s:e]
+        (t, i, p) = (np.minimum(sub[:, k], 255) for k in (0, -2, -1))
+        # Unsigned, so anything below "0" wraps around to more than 9.
+        met_codes = sub[:, 1:-2] - zero
+        ok = (
+            targets[t] & instruments[i] & products[p]
+            & (met_codes < 10).all(axis=1)
+        )
+        met = np.zeros(len(rows), dtype=np.int64)
+        for column in met_codes.T:
+            met = met * 10 + column
+        if not ok.all():
+            (rows, t, i, p, met) = (x[ok] for x in (rows, t, i, p, met))
+        out["target"][rows] = chars[t]
+        out["met"][rows] = met
+        out["instrument"][rows] = chars[i]
+        out["product"][rows] = chars[p]
+        valid[rows] = True
+
+    # Anything else gets the same regex search that LROCID uses.
+    for i in np.flatnonzero(~valid):
+        s = a[i]
+        if isinstance(s, bytes):
+            s = s.decode("latin-1")
+        match = obsid_re.search(str(s))
+        if match is None:
+            continue
+        met = int(match["met"])
+        if met >> 63:
+            continue
+        out[i] = (
+            match["target"], met, match["instrument"], match["product"]
+        )
+        valid[i] = True
+
+    return out, valid
+
+
+class LROCIndex:
+    """An index of many LROC product IDs, sorted by MET, which can be
+    queried for the products in a range of METs, the products of each
+    observation (like the Left and Right NAC products with the same
+    target and MET), and the observations nearest in time to others.
+    Queries use binary search, so pairing every observation in one
+    index with its nearest in another takes O(n log n) time.
+
+    :ivar records: A NumPy structured array, with the fields of
+        id_dtype, of the valid IDs, sorted by met, target, instrument,
+        and product.
+    :ivar positions: For each of the records, the position of its ID in
+        the IDs that the index was made from.
+    :ivar invalid: The positions of the IDs that were not valid.
+    :ivar observations: A structured array of each observation (target
+        and met) in the records, in the same order, with the start and
+        stop of the slice of the records that are its products.
+    """
+
+    def __init__(self, ids):
+        import numpy as np
+
+        parsed, valid = parse_ids(ids)
+        positions = np.flatnonzero(valid)
+        self.invalid = np.flatnonzero(~valid)
+        self._index(np.take(parsed, positions), positions)
+
+    def _index(self, records, positions):
+        import numpy as np
+
+        # The characters, as their codes, sort much faster than strings,
+        # and faster still when they fit in one key with the met (which
+        # is about 10 digits, for any real LROC product).
+        (t, i, p) = (
+            np.ascontiguousarray(records[f]).view(np.uint32)
+            for f in ("target", "instrument", "product")
+        )
+        chars = t << 16 | i << 8 | p
+        met = records["met"]
+        if len(met) and met.min() >= 0 and met.max() < 2 ** 40:
+            key = met.astype(np.uint64) << np.uint64(24) | chars
+            order = np.argsort(key, kind="stable")
+        else:
+            order = np.lexsort((chars, met))
+        # np.take() is much faster than indexing for structured arrays.
+        self.records = np.take(records, order)
+        self.positions = positions[order]
+        self._met = np.ascontiguousarray(self.records["met"])
+
+        targets = self.records["target"]
+        new = np.ones(len(self.records), dtype=bool)
+        new[1:] = (
+            (self._met[1:] != self._met[:-1]) | (targets[1:] != targets[:-1])
+        )
+        starts = np.flatnonzero(new)
+        self.observations = np.zeros(
+            len(starts),
+            dtype=[("target", "U1"), ("met", "i8"), ("start", "i8"),
+                   ("stop", "i8")]
+        )
+        self.observations["target"] = targets[starts]
+        self.observations["met"] = self._met[starts]
+        self.observations["start"] = starts
+        self.observations["stop"][:-1] = starts[1:]
+        self.observations["stop"][-1:] = len(self.records)
+        self._obs_met = np.ascontiguousarray(self.observations["met"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def subset(self, target=None, instrument=None, product=None):
+        """Returns a new LROCIndex of just the records with the given
+        target, instrument, and product characters (each of which may
+        also be a string of several of them), like subset(instrument="LR")
+        for the NAC products."""
+        import numpy as np
+
+        keep = np.ones(len(self.records), dtype=bool)
+        for field, chars in (
+            ("target", target), ("instrument", instrument),
+            ("product", product)
+        ):
+            if chars is not None:
+                keep &= np.isin(self.records[field], list(chars))
+        index = self.__class__.__new__(self.__class__)
+        index.invalid = self.invalid
+        keep = np.flatnonzero(keep)
+        index._index(np.take(self.records, keep), self.positions[keep])
+        return index
+
+    def range(self, start, stop):
+        """Returns the records with a met at or after *start*, and
+        before *stop*."""
+        (i, j) = self._met.searchsorted([start, stop])
+        return self.records[i:j]
+
+    def products(self, observation):
+        """Returns the records of the products of the *observation*,
+        which may be an LROCID or a string with a target and MET, like
+        "M1234567890"."""
+        if isinstance(observation, LROCID):
+            (target, met) = (observation.target, observation.met)
+        else:
+            match = observation_re.search(str(observation))
+            if match is None:
+                raise ValueError(
+                    f"{observation} did not match regex: "
+                    f"{observation_re.pattern}"
+                )
+            (target, met) = (match["target"], int(match["met"]))
+
+        (i, j) = self._obs_met.searchsorted([met, met + 1])
+        for obs in self.observations[i:j]:
+            if obs["target"] == target:
+                return self.records[obs["start"]:obs["stop"]]
+        return self.records[0:0]
+
+    def groups(self):
+        """Yields the observation string, like "M1234567890", and the
+        records of its products for each observation, in MET order."""
+        for target, met, start, stop in self.observations:
+            yield f"{target}{met}", self.records[start:stop]
+
+    def nearest(self, met):
+        """Returns the indexes into observations of the observations
+        nearest in time to each of the *met* (a number or an array of
+        them), and the seconds from each *met* to those observations'
+        met.  Of two observations that are equally near, the earlier is
+        returned."""
+        import numpy as np
+
+        if len(self.observations) == 0:
+            raise ValueError("There are no observations in this index.")
+        met = np.asarray(met, dtype=np.int64)
+        after = self._obs_met.searchsorted(met)
+        before = np.maximum(after - 1, 0)
+        after = np.minimum(after, len(self._obs_met) - 1)
+        nearest = np.where(
+            np.abs(self._obs_met[after] - met)
+            < np.abs(self._obs_met[before] - met),
+            after, before
+        )
+        return nearest, self._obs_met[nearest] - met
+
+    def pairs(self, other, max_seconds):
+        """Returns two arrays of indexes into the observations of this
+        index and of the LROCIndex *other*, which pair each observation
+        of this index with the nearest observation in *other*, when it
+        is no more than *max_seconds* away.  If *other* has no
+        observations, both arrays are empty."""
+        import numpy as np
+
+        if len(other.observations) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        (nearest, seconds) = other.nearest(self._obs_met)
+        paired = np.abs(seconds) <= max_seconds
+        return np.flatnonzero(paired), nearest[paired]
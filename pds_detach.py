@@ -17,8 +17,12 @@
 # This program is for dealing with .img files that come out of isis2pds and splitting them
 # into detached labels for PDS3.
 
-import os, sys, optparse
-import pvl
+import os, re, sys, optparse, shutil, tempfile, time
+import concurrent.futures
+
+import isisversion
+import readlabel
+import specialpixels
 
 
 def man(option, opt, value, parser):
@@ -32,107 +36,311 @@ class UsageError(Exception):
     def __init__(self, msg):
         self.msg = msg
 
+def copy_data(infile, outfile, chunk_size=16 * 2 ** 20):
+    '''Copies everything from the current position of the binary file
+    object infile to the end of it onto outfile, without holding more
+    than chunk_size bytes in memory.  The kernel does the copying with
+    copy_file_range() or sendfile() if it can, and otherwise it is done
+    a chunk at a time.'''
+    outfile.flush()
+    in_fd = infile.fileno()
+    out_fd = outfile.fileno()
+    offset = infile.tell()
+    remaining = os.fstat(in_fd).st_size - offset
+
+    for name in ('copy_file_range', 'sendfile'):
+        func = getattr(os, name, None)
+        if func is None:
+            continue
+        try:
+            while remaining > 0:
+                if name == 'copy_file_range':
+                    n = func(in_fd, out_fd, min(remaining, 2 ** 30), offset)
+                else:
+                    n = func(out_fd, in_fd, offset, min(remaining, 2 ** 30))
+                if n == 0:
+                    break
+                offset += n
+                remaining -= n
+            infile.seek(offset)
+            return
+        except OSError:
+            # Not for these files (different file systems on older
+            # kernels, or a non-Linux OS), so try the next way, picking
+            # up wherever this one left off.
+            continue
+
+    infile.seek(offset)
+    shutil.copyfileobj(infile, outfile, chunk_size)
+
+# The label is rewritten a line at a time in one pass over its bytes.  Each
+# keyword line is looked up by its keyword in a table of rules, and the
+# values of the keywords that the rules need are picked up from the lines
+# as they go by.  Some of those values (like the LINES of the IMAGE object)
+# come after the lines that need them, so a rule can give back a function
+# of the values, to be called once the whole label has been seen, instead
+# of the bytes of the new line.
+
+object_line = re.compile(rb'^[ \t]*(END_)?OBJECT[ \t]*(?:=[ \t]*([A-Za-z0-9_]+))?[ \t]*$', re.IGNORECASE)
+keyword_line = re.compile(rb'^([ \t]*)(\^?[A-Za-z0-9_:]+)[ \t]*=[ \t]*(.*?)[ \t]*$')
+
+def _number(value):
+    '''Returns the number at the start of value, without any <units>.'''
+    number = value.split()[0]
+    return float(number) if b'.' in number or b'E' in number.upper() else int(number)
+
+# The keywords whose values rewrite_label() picks up, by the object they are
+# in (None for the top level of the label), and how to read them.
+label_values = {
+    (None, b'RECORD_TYPE'): lambda v: v.strip(b'"').decode('ascii'),
+    (None, b'LABEL_RECORDS'): _number,
+    (b'IMAGE', b'LINES'): _number,
+    (b'IMAGE', b'LINE_SAMPLES'): _number,
+    (b'IMAGE', b'SAMPLE_BITS'): _number,
+    (b'IMAGE', b'OFFSET'): _number,
+    (b'IMAGE', b'SCALING_FACTOR'): _number,
+}
+
+def _assign(indent, keyword, eq, value):
+    '''Returns a keyword line with its = in the same column, eq, as the line it replaces.'''
+    return indent + keyword.ljust(eq - len(indent)) + b'= ' + value
+
+def _record_type(indent, keyword, eq, value):
+    if value != b'UNDEFINED': return None
+    return lambda values: b'\r\n'.join((
+        _assign(indent, keyword, eq, b'FIXED_LENGTH'),
+        _assign(indent, b'FILE_RECORDS', eq, str(values['LINES']).encode('ascii')),
+        _assign(indent, b'RECORD_BYTES', eq, str(
+            int((values['SAMPLE_BITS'] / 8) * values['LINE_SAMPLES'])).encode('ascii'))))
+
+def _drop(indent, keyword, eq, value):
+    return b''
+
+def _set_to(new):
+    def rule(indent, keyword, eq, value):
+        if _number(value) == _number(new): return None
+        return _assign(indent, keyword, eq, new)
+    return rule
+
+def _rename_to(new):
+    def rule(indent, keyword, eq, value):
+        return _assign(indent, new, eq, value)
+    return rule
+
+def image_pointer(data_file, offset=False):
+    '''Returns a rule that points ^IMAGE to the data_file name, or with offset,
+    to the byte just after the label in that file.'''
+    def rule(indent, keyword, eq, value):
+        def line(values):
+            if offset: pointer = '("{}", {} <BYTES>)'.format(data_file, values['LABEL_RECORDS'] + 1)
+            else: pointer = '"{}"'.format(data_file)
+            return _assign(indent, keyword, eq, pointer.encode('ascii'))
+        return line
+    return rule
+
+# For each keyword, a function of the line's indent, keyword, the column of
+# its =, and its value, that returns the bytes to replace the line with
+# (b'' to drop it), None to keep it as it is, or a function of the values
+# picked up from the label that returns those bytes.  Rules for ^IMAGE are
+# made by image_pointer().
+detach_rules = {
+    b'RECORD_TYPE': _record_type,
+    b'LABEL_RECORDS': _drop,
+}
+
+# The rules for --edit, on top of detach_rules.
+edit_rules = {
+    b'OFFSET': _set_to(b'0.0'),
+    b'SCALING_FACTOR': _set_to(b'1.0'),
+    b'CORE_NULL': _rename_to(b'MISSING_CONSTANT'),
+    b'CORE_LOW_REPR_SATURATION': _drop,
+    b'CORE_LOW_INSTR_SATURATION': _drop,
+    b'CORE_HIGH_REPR_SATURATION': _drop,
+    b'CORE_HIGH_INSTR_SATURATION': _drop,
+}
+
+def rewrite_label(label, rules):
+    '''Returns the bytes of the PVL label after applying the rules (a
+    dictionary like detach_rules) to it in one pass, with CRLF line endings,
+    and a dictionary of the values of the label_values keywords found in it.
+
+    Lines that no rule changes are kept byte for byte, so this can also be
+    used to make the same edits to the labels of many files.'''
+    values = dict()
+    out = list()
+    objects = list()
+    for line in label.splitlines():
+        match = object_line.match(line)
+        if match is not None:
+            if match.group(1):
+                if objects: objects.pop()
+            else:
+                objects.append(( match.group(2) or b'' ).upper())
+            out.append(line)
+            continue
+
+        match = keyword_line.match(line)
+        if match is None:
+            out.append(line)
+            continue
+
+        (indent, keyword, value) = match.group(1, 2, 3)
+        keyword = keyword.upper()
+        reader = label_values.get((objects[-1] if objects else None, keyword))
+        if reader is not None:
+            values[keyword.decode('ascii')] = reader(value)
+
+        rule = rules.get(keyword)
+        new = None if rule is None else rule(indent, keyword, line.find(b'='), value)
+        if new is None: out.append(line)
+        elif new != b'': out.append(new)
+
+    out = [l(values) if callable(l) else l for l in out]
+    return b'\r\n'.join(out) + b'\r\n', values
+
 def main():
-    parser = optparse.OptionParser(usage="usage %prog [--help] [-o outname][-i isis2pds commands][-e] <file.img|file.cub>")
+    parser = optparse.OptionParser(usage="usage %prog [--help] [-o outname][-i isis2pds commands][-e][-p][-j jobs] <file.img|file.cub> [...]")
     parser.add_option("-o","--output", dest="outname", help="output will be written to FILE.lbl and FILE.img", metavar="FILE")
     parser.add_option("-i","--isis2pds", dest="isis2pds", help="string of options to pass to pds2isis")
     parser.add_option("-e", "--edit", action="store_true", dest="edit", default=False,
                   help="The program will attempt to edit the labels.")
-    
+    parser.add_option("-p", "--pointer", action="store_true", dest="pointer", default=False,
+                  help="Only write the detached label, with a pointer to the image data "
+                       "at its byte offset in the original file, rather than copying it.")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=None,
+                  help="When given more than one file, the number of them to work on at once "
+                       "(default is the number of CPUs).")
+
 
     (options, args) = parser.parse_args()
 
     if not args: parser.error("need an .img or .cub file")
 
-    imgfilename = args[0]
+    kwargs = dict( isis2pds=options.isis2pds, edit=options.edit, pointer=options.pointer )
 
-    (root, ext) = os.path.splitext( imgfilename )
+    if len(args) == 1:
+        try:
+            detach( args[0], outname=options.outname, **kwargs )
+        except UsageError as err:
+            parser.error( err.msg )
+        return
 
-    if( ext == '.cub' ):
-        # Check for weird pixels that PDS doesn't want.
-        statspvl = root+'_stats.pvl'
-        statscmd = 'stats fr='+args[0]+' to= '+statspvl
-        print( statscmd )
-        os.system(statscmd)
-        stats = pvl.load( statspvl )
-        os.remove( statspvl )
-        if( stats['Results']['LisPixels'] != 0 ): parser.error( args[0]+' has LisPixels!' )
-        if( stats['Results']['LrsPixels'] != 0 ): parser.error( args[0]+' has LrsPixels!' )
-        if( stats['Results']['HisPixels'] != 0 ): parser.error( args[0]+' has HisPixels!' )
-        if( stats['Results']['HrsPixels'] != 0 ): parser.error( args[0]+' has HrsPixels!' )
+    if options.outname: parser.error("-o can only be used with a single file")
 
+    failures = 0
+    total = time.perf_counter()
+    for filename, seconds, error in detach_many( args, jobs=options.jobs, **kwargs ):
+        if error is None:
+            print( '{:10.2f} s  ok      {}'.format( seconds, filename ) )
+        else:
+            failures += 1
+            print( '{:10.2f} s  FAILED  {}: {}'.format( seconds, filename, error ) )
+    print( '{} of {} files detached in {:.2f} s, {} failed.'.format(
+        len(args) - failures, len(args), time.perf_counter() - total, failures ) )
+    if failures: return 1
 
-        # Run isis2pds
-        imgfilename = 'isis2pds.img'
-        cmd = 'isis2pds fr= '+args[0]+' to= '+imgfilename
-        if options.isis2pds: cmd += ' '+options.isis2pds
-        print( cmd )
-        os.system(cmd)
 
-    label = pvl.load( imgfilename )
+def detach_many( filenames, jobs=None, **kwargs ):
+    '''Runs detach() on each of the filenames with the given keyword arguments,
+    jobs of them at a time in separate processes, and yields a tuple of the
+    filename, the seconds it took, and an error message (or None if it
+    succeeded) for each, in the same order as filenames.'''
+    with concurrent.futures.ProcessPoolExecutor( max_workers=jobs ) as executor:
+        futures = [ executor.submit( _timed_detach, f, **kwargs ) for f in filenames ]
+        for filename, future in zip( filenames, futures ):
+            yield ( filename, ) + future.result()
+
+
+def _timed_detach( filename, **kwargs ):
+    '''Returns the seconds that detach() took, and its error message or None.'''
+    start = time.perf_counter()
+    try:
+        detach( filename, **kwargs )
+        error = None
+    except UsageError as err:
+        error = err.msg
+    except Exception as err:
+        error = '{}: {}'.format( type(err).__name__, err )
+    return time.perf_counter() - start, error
+
+
+def detach( filename, outname=None, isis2pds=None, edit=False, pointer=False ):
+    '''Writes a detached PDS3 label and image for filename, which is either
+    an .img from isis2pds or an ISIS .cub that isis2pds will be run on.  The
+    outputs are outname.lbl and outname.img, or filename with -det.lbl and
+    -det.img if outname is not given.  With pointer, the label points to the
+    image data in filename (or the isis2pds output) rather than copying it.
+    Raises UsageError for problems with the inputs or outputs.'''
+    (root, ext) = os.path.splitext( filename )
 
     label_file = root+'-det.lbl'
     data_file  = root+'-det.img'
 
-    if options.outname:
-        label_file = options.outname+'.lbl'
-        data_file = options.outname+'.img'
+    if outname:
+        label_file = outname+'.lbl'
+        data_file = outname+'.img'
         if( os.path.exists(label_file) ):
-            parser.error(label_file+' exists!')
-        if( os.path.exists(data_file) ):
-            parser.error(data_file+' exists!')
-
-    with open( imgfilename, 'rb') as infile:
-        with open( label_file, 'wb') as outfile:
-            ## outfile.write( infile.read( label['LABEL_RECORDS'].value ) )
-            # It sure would be nice to perform this manipulation with the pvl library,
-            # but it parses input values instead of preserving the bytes, so we'll have
-            # to do this the heavy-handed way:
-            label_lines = infile.read( label['LABEL_RECORDS'].value ).split(b'\r\n')
-            for line in label_lines:
-                #print( line )
-                if( label['RECORD_TYPE'] == 'UNDEFINED' and line.startswith( b'RECORD_TYPE' ) ):
-                   outfile.write( line.replace(b'UNDEFINED',b'FIXED_LENGTH')+b'\r\n' )
-                   i = line.find(b'=')
-                   outfile.write( b'FILE_RECORDS'.ljust(i)+b'= '+str( 
-                       label['IMAGE']['LINES'] ).encode('ascii') + b'\r\n' )
-                   outfile.write( b'RECORD_BYTES'.ljust(i)+b'= '+ str(
-                       int( (label['IMAGE']['SAMPLE_BITS'] / 8) * label['IMAGE']['LINE_SAMPLES'] )
-                       ).encode('ascii') + b'\r\n' )
-                elif( line.startswith( b'LABEL_RECORDS' ) ): continue
-                elif( line.startswith( b'^IMAGE' ) ):
-                    outfile.write( b'^IMAGE'.ljust(i)+b'= "'+os.path.basename(data_file).encode('ascii')+b'"\r\n' )
-                elif( options.edit ):
-                    if( label['IMAGE']['OFFSET'] != 0.0 and line.lstrip().startswith( b'OFFSET' ) ):
-                        i = line.find(b'=')
-                        outfile.write( b'  OFFSET'.ljust(i)+b'= 0.0\r\n' )
-                    elif( label['IMAGE']['SCALING_FACTOR'] != 1.0 and line.lstrip().startswith( b'SCALING_FACTOR' ) ):
-                        i = line.find(b'=')
-                        outfile.write( b'  SCALING_FACTOR'.ljust(i)+b'= 1.0\r\n' )
-                    elif( line.lstrip().startswith( b'CORE_NULL' ) ):
-                        outfile.write( line.replace(b'CORE_NULL       ',b'MISSING_CONSTANT')+b'\r\n' )
-                    elif( line.lstrip().startswith( b'CORE_LOW_REPR_SATURATION' ) ): continue
-                    elif( line.lstrip().startswith( b'CORE_LOW_INSTR_SATURATION' ) ): continue
-                    elif( line.lstrip().startswith( b'CORE_HIGH_REPR_SATURATION' ) ): continue
-                    elif( line.lstrip().startswith( b'CORE_HIGH_INSTR_SATURATION' ) ): continue
-                    else: outfile.write( line + b'\r\n' )
-
-                else: outfile.write( line + b'\r\n' )
-
-        with open( data_file, 'wb') as outfile:
-            outfile.write( infile.read() )
-   
-    if( ext == '.cub' ): os.remove( imgfilename )
-
-
-    #print( pvl.dumps( label ) )
-    #print( str( pvl.dumps( label ), 'ascii') )
-
-    # # label_file
-    # outfile = 'label.lbl'
-    # ascii_label = pvl.dumps(label)
-    # with open( outfile, 'wb') as f:
-    #     f.write(ascii_label)
+            raise UsageError(label_file+' exists!')
+        if( os.path.exists(data_file) and not( pointer and ext != '.cub' ) ):
+            raise UsageError(data_file+' exists!')
+
+    if( ext == '.cub' ):
+        # Check for weird pixels that PDS doesn't want.
+        try:
+            special = specialpixels.first_special( filename )
+        except ValueError as err:
+            raise UsageError( str( err ) )
+        if special is not None:
+            raise UsageError( filename+' has {}Pixels! (first at sample {}, line {}, band {})'.format( *special ) )
+
+
+        # Run isis2pds
+        isis2pds_path = isisversion.probe().program('isis2pds')
+        if isis2pds_path is None:
+            raise UsageError( 'Could not find the ISIS isis2pds program.  Is $ISISROOT set?' )
+        if pointer:
+            # With --pointer, the isis2pds output is kept as the data file.
+            imgfilename = data_file
+        else:
+            # A scratch file of its own, so that many of these can run at once,
+            # next to the data file so that it can be copied from kernel-side.
+            (fd, imgfilename) = tempfile.mkstemp( prefix=os.path.basename(root)+'-', suffix='.img',
+                                                  dir=os.path.dirname( os.path.abspath(data_file) ) )
+            os.close( fd )
+        try:
+            cmd = isis2pds_path+' fr= '+filename+' to= '+imgfilename
+            if isis2pds: cmd += ' '+isis2pds
+            print( cmd )
+            if( os.system(cmd) != 0 ): raise UsageError( 'isis2pds failed on '+filename )
+
+            split( imgfilename, label_file, data_file, edit=edit, pointer=pointer )
+        finally:
+            if not pointer: os.remove( imgfilename )
+    else:
+        split( filename, label_file, data_file, edit=edit, pointer=pointer )
+
+
+def split( imgfilename, label_file, data_file, edit=False, pointer=False ):
+    '''Writes the label of the isis2pds .img imgfilename to the detached label
+    label_file, and its image data to data_file, or with pointer, has the label
+    point to the image data in imgfilename.'''
+    rules = dict( detach_rules )
+    if edit: rules.update( edit_rules )
+    if pointer:
+        rules[b'^IMAGE'] = image_pointer(
+            os.path.relpath( imgfilename, os.path.dirname( os.path.abspath(label_file) ) ), offset=True )
+    else:
+        rules[b'^IMAGE'] = image_pointer( os.path.basename(data_file) )
+
+    ( label, values ) = rewrite_label( readlabel.label_bytes( imgfilename ), rules )
+    with open( label_file, 'wb') as outfile:
+        outfile.write( label )
+
+    if not pointer:
+        with open( imgfilename, 'rb') as infile:
+            infile.seek( values['LABEL_RECORDS'] )
+            with open( data_file, 'wb') as outfile:
+                copy_data( infile, outfile )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""Builds and queries a persistent spatial index over a local archive of
+laser altimeter point tables (like LOLA RDR files, or MOLA PEDR data
+converted to tables), so that the points in a longitude/latitude box can
+be found without the network or a scan of the archive.  With just a
+directory, (re)builds its index if any of the tables have changed.  If a
+W/E/S/N box is given, prints the points in that box as CSV."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# An archive is a directory tree of PDS3 labels (*.lbl or *.LBL) which
+# point to a TABLE or SPREADSHEET of points.  Binary tables, fixed-width
+# ASCII tables, and comma-separated spreadsheets with a header line
+# (like the GDS topo CSV files) can be read.  Columns with SCALING_FACTOR
+# or OFFSET are converted to physical values, and columns of several
+# ITEMS become one column per item, NAME_1, NAME_2, and so on.  All of
+# the tables in an archive must have the same columns.
+#
+# The index is a topo2npy.py store in the .index directory of the
+# archive: every point of every table, sorted by the Morton key of its
+# longitude and latitude.  To sort more points than fit in memory, the
+# points are read about chunk_rows at a time, and each chunk is sorted
+# and written to a scratch file as a sorted run.  The runs are then
+# merged a block from each at a time into the store, so that memory use
+# doesn't depend on how the points are spread out.  The index records
+# the size and modification time of every file it was built from, so
+# that it can tell when it needs to be rebuilt without reading any
+# labels that haven't changed.
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pvl
+
+import topo2npy
+
+# How PDS3 binary DATA_TYPEs are read, by NumPy dtype kind and byte order.
+binary_types = {
+    "MSB_INTEGER": ">i", "INTEGER": ">i", "SUN_INTEGER": ">i",
+    "MAC_INTEGER": ">i",
+    "LSB_INTEGER": "<i", "PC_INTEGER": "<i", "VAX_INTEGER": "<i",
+    "MSB_UNSIGNED_INTEGER": ">u", "UNSIGNED_INTEGER": ">u",
+    "SUN_UNSIGNED_INTEGER": ">u", "MAC_UNSIGNED_INTEGER": ">u",
+    "LSB_UNSIGNED_INTEGER": "<u", "PC_UNSIGNED_INTEGER": "<u",
+    "VAX_UNSIGNED_INTEGER": "<u",
+    "IEEE_REAL": ">f", "REAL": ">f", "SUN_REAL": ">f", "MAC_REAL": ">f",
+    "FLOAT": ">f", "PC_REAL": "<f",
+}
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+    )
+    parser.add_argument(
+        "-b", "--box",
+        help="A W/E/S/N string of the points to print."
+    )
+    parser.add_argument(
+        "--lon",
+        help="The name of the longitude column to index.  Default is the "
+             "first column with 'lon' in its name."
+    )
+    parser.add_argument(
+        "--lat",
+        help="The name of the latitude column to index.  Default is the "
+             "first column with 'lat' in its name."
+    )
+    parser.add_argument(
+        "directory",
+        type=Path,
+        help="The directory of the archive."
+    )
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    args = parser.parse_args()
+
+    archive = Archive(args.directory, lon=args.lon, lat=args.lat)
+    archive.update()
+
+    if args.box is not None:
+        west, east, south, north = (float(x) for x in args.box.split("/"))
+        topo2npy.write_csv(archive.query(south, north, west, east), sys.stdout)
+
+
+def find_file(directory, name):
+    """Returns the path of the file *name* in *directory*, matching the
+    name without regard to case if it doesn't exist as given, since PDS
+    labels and file systems don't always agree on case."""
+    path = Path(directory) / name
+    if path.exists():
+        return path
+    for p in Path(directory).iterdir():
+        if p.name.casefold() == name.casefold():
+            return p
+    raise FileNotFoundError(f"No {name} in {directory}")
+
+
+def _bytes(value):
+    # Returns the integer value of a keyword which may have units.
+    return int(getattr(value, "value", value))
+
+
+def table_pointer(label, label_path):
+    """Returns a three-tuple of the name of the table object in the PDS3
+    *label*, the path of the file it is in, and the byte offset of the
+    table in that file."""
+    for key, value in label.items():
+        if not key.startswith("^"):
+            continue
+        name = key[1:]
+        if not (
+            name in ("TABLE", "SPREADSHEET") or name.endswith("_TABLE")
+        ) or name not in label:
+            continue
+
+        filename = None
+        if isinstance(value, (list, tuple)):
+            filename, value = value
+        elif isinstance(value, str):
+            filename, value = value, 1
+
+        if getattr(value, "units", "").upper() == "BYTES":
+            offset = _bytes(value) - 1
+        else:
+            offset = (int(value) - 1) * _bytes(label.get("RECORD_BYTES", 0))
+
+        if filename is None:
+            path = Path(label_path)
+        else:
+            path = find_file(Path(label_path).parent, filename)
+        return name, path, offset
+
+    raise ValueError(f"No TABLE or SPREADSHEET pointer in {label_path}")
+
+
+def table_columns(table):
+    """Returns a two-tuple of the NumPy dtype of the records of the PDS3
+    fixed-width *table* object, and a list of (name, field, scale,
+    offset, dtype) tuples of how to get the physical value of each
+    column from the records."""
+    ascii_table = table.get("INTERCHANGE_FORMAT", "BINARY") == "ASCII"
+    prefix = _bytes(table.get("ROW_PREFIX_BYTES", 0))
+    row_bytes = (
+        prefix + _bytes(table["ROW_BYTES"]) +
+        _bytes(table.get("ROW_SUFFIX_BYTES", 0))
+    )
+
+    names, formats, offsets, columns = list(), list(), list(), list()
+    for key, col in table.items():
+        if key != "COLUMN":
+            continue
+        items = int(col.get("ITEMS", 1))
+        item_bytes = _bytes(col.get("ITEM_BYTES", col["BYTES"]))
+        item_step = item_bytes + _bytes(col.get("ITEM_OFFSET", 0))
+        if items == 1:
+            item_step = 0
+        data_type = col["DATA_TYPE"]
+        scale = col.get("SCALING_FACTOR", 1)
+        offset = col.get("OFFSET", 0)
+
+        if ascii_table:
+            fmt = f"S{item_bytes}"
+            if data_type == "ASCII_INTEGER" and scale == 1 and offset == 0:
+                out = np.dtype("i8")
+            elif data_type in ("ASCII_REAL", "ASCII_INTEGER"):
+                out = np.dtype("f8")
+            else:
+                out = np.dtype(f"U{item_bytes}")
+        elif data_type in binary_types:
+            fmt = f"{binary_types[data_type]}{item_bytes}"
+            if scale == 1 and offset == 0:
+                out = np.dtype(fmt).newbyteorder("=")
+            else:
+                out = np.dtype("f8")
+        elif data_type == "CHARACTER":
+            fmt = f"S{item_bytes}"
+            out = np.dtype(f"U{item_bytes}")
+        else:
+            # VAX_REAL, BIT_STRING, and the like aren't topography.
+            continue
+
+        for k in range(items):
+            name = col["NAME"] if items == 1 else f"{col['NAME']}_{k + 1}"
+            names.append(name)
+            formats.append(fmt)
+            offsets.append(
+                prefix + _bytes(col["START_BYTE"]) - 1 + k * item_step
+            )
+            columns.append((name, name, scale, offset, out))
+
+    dtype = np.dtype(dict(
+        names=names, formats=formats, offsets=offsets, itemsize=row_bytes
+    ))
+    return dtype, columns
+
+
+def physical(records, columns):
+    """Returns a structured array of the physical values of the *columns*
+    (from table_columns()) of the *records*."""
+    out = np.empty(len(records), dtype=[(c[0], c[4]) for c in columns])
+    for name, field, scale, offset, dtype in columns:
+        values = records[field]
+        if dtype.kind == "U":
+            out[name] = np.char.strip(np.char.decode(values, "latin-1"))
+        elif scale == 1 and offset == 0:
+            out[name] = values.astype(dtype)
+        else:
+            out[name] = values.astype("f8") * scale + offset
+    return out
+
+
+def read_table(label_path, chunk_rows=1000000):
+    """Yields structured arrays of up to *chunk_rows* points at a time
+    from the table or spreadsheet described by the PDS3 label at
+    *label_path*."""
+    label = pvl.load(str(label_path))
+    name, path, start = table_pointer(label, label_path)
+    table = label[name]
+
+    if name == "SPREADSHEET" or "FIELD_DELIMITER" in table:
+        with open(path, newline="") as f:
+            f.seek(start)
+            header = f.readline()
+            dtype = topo2npy.label_dtype(label_path, header)
+            while True:
+                lines = [
+                    line for line in itertools.islice(f, chunk_rows)
+                    if line.strip()
+                ]
+                if not lines:
+                    return
+                yield np.loadtxt(
+                    lines, delimiter=",", dtype=dtype, ndmin=1,
+                    converters=lambda s: s.strip()
+                )
+
+    dtype, columns = table_columns(table)
+    if "ROWS" in table:
+        rows = int(table["ROWS"])
+    else:
+        rows = (os.path.getsize(path) - start) // dtype.itemsize
+    if rows == 0:
+        # NumPy can't map an empty table.
+        return
+    records = np.memmap(
+        path, dtype=dtype, mode="r", offset=start, shape=(rows,)
+    )
+    for i in range(0, rows, chunk_rows):
+        yield physical(records[i:i + chunk_rows], columns)
+
+
+def merge_runs(records, keys, runs, points, keys_out, block):
+    """Merges the sorted (start, stop) *runs* of the *records* and their
+    *keys* into *points* and *keys_out*, in key order, reading up to
+    *block* rows from each run at a time."""
+    pos = [start for start, stop in runs]
+    i = 0
+    while True:
+        live = [r for r, (start, stop) in enumerate(runs) if pos[r] < stop]
+        if not live:
+            return
+        ends = {r: min(pos[r] + block, runs[r][1]) for r in live}
+
+        # Every row still to come from a run has a key at least as big as
+        # the last one of its block, so every row up to the smallest of
+        # those can go out now.  All of the block of that run goes, so
+        # each pass takes at least one block.
+        bound = min(keys[ends[r] - 1] for r in live)
+        parts = list()
+        for r in live:
+            n = int(np.searchsorted(
+                keys[pos[r]:ends[r]], bound, side="right"
+            ))
+            parts.append((records[pos[r]:pos[r] + n], keys[pos[r]:pos[r] + n]))
+            pos[r] += n
+        merged_keys = np.concatenate([p[1] for p in parts])
+        order = np.argsort(merged_keys, kind="stable")
+        n = len(order)
+        points[i:i + n] = np.concatenate([p[0] for p in parts])[order]
+        keys_out[i:i + n] = merged_keys[order]
+        i += n
+
+
+class Archive:
+    """A directory of PDS3 point tables and the spatial index of them.
+
+    :ivar directory: The directory of the archive.
+    :ivar index: The directory of the index, by default .index in the
+        archive directory.
+    :ivar points_path: The topo2npy.py store of the points.
+    """
+
+    def __init__(self, directory, index=None, lon=None, lat=None):
+        self.directory = Path(directory)
+        self.index = Path(index) if index else self.directory / ".index"
+        self.points_path = self.index / "points.npy"
+        self.manifest_path = self.index / "manifest.json"
+        self.lon = lon
+        self.lat = lat
+
+    def labels(self):
+        """Returns a sorted list of the paths of the labels in the
+        archive."""
+        return sorted(
+            p for p in self.directory.rglob("*")
+            if p.suffix.casefold() == ".lbl" and self.index not in p.parents
+        )
+
+    def manifest(self):
+        """Returns the stamp() that the index was built from, or None if
+        there isn't an index."""
+        if not (self.manifest_path.exists() and self.points_path.exists()):
+            return None
+        return json.loads(self.manifest_path.read_text())["files"]
+
+    def stamp(self, previous=None):
+        """Returns a list of [label, size, mtime_ns, table, size,
+        mtime_ns] lists of the labels in the archive and the files that
+        they point to, with paths relative to the archive directory.
+
+        Only the sizes and modification times of the files are looked
+        at, except that a label is read to find the file it points to if
+        it isn't in the *previous* stamp with the same size and
+        modification time.  A label which doesn't point to a table has
+        None in place of the table."""
+        known = {tuple(entry[:3]): entry[3] for entry in previous or ()}
+        stamp = list()
+        for label_path in self.labels():
+            st = label_path.stat()
+            entry = [
+                str(label_path.relative_to(self.directory)), st.st_size,
+                st.st_mtime_ns
+            ]
+            table = known.get(tuple(entry), False)
+            if table is False:
+                table = None
+                with contextlib.suppress(ValueError, FileNotFoundError):
+                    table = str(table_pointer(
+                        pvl.load(str(label_path)), label_path
+                    )[1].relative_to(self.directory))
+            entry.append(table)
+            if table is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    st = (self.directory / table).stat()
+                    entry.extend((st.st_size, st.st_mtime_ns))
+            stamp.append(entry)
+        return stamp
+
+    def is_current(self):
+        """Returns True if the index exists and was built from the files
+        that are now in the archive."""
+        manifest = self.manifest()
+        return manifest is not None and manifest == self.stamp(manifest)
+
+    def update(self):
+        """Builds the index if it isn't current, and returns True if it
+        was built."""
+        manifest = self.manifest()
+        stamp = self.stamp(manifest)
+        if manifest == stamp:
+            return False
+        self.build(stamp=stamp)
+        return True
+
+    def build(self, chunk_rows=1000000, stamp=None):
+        """Builds the index of every point in the archive, recording the
+        *stamp* of the archive that it was built from, which is taken if
+        not given.  Labels that don't point to a table (like those of
+        the documents on a PDS volume) are skipped."""
+        start_time = time.perf_counter()
+        if stamp is None:
+            stamp = self.stamp()
+        labels = [
+            self.directory / entry[0] for entry in stamp
+            if entry[3] is not None
+        ]
+        if not labels:
+            raise ValueError(
+                f"No PDS3 labels of tables in {self.directory}"
+            )
+
+        self.index.mkdir(parents=True, exist_ok=True)
+        tmp = self.index / "runs"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        dtype = None
+        runs = list()
+        try:
+            with open(tmp / "runs.rec", "wb") as rec_file, \
+                    open(tmp / "runs.key", "wb") as key_file:
+                pending = list()
+
+                def write_run():
+                    # Sorts the pending chunks, and writes them as a run.
+                    records = np.concatenate([c[0] for c in pending])
+                    keys = np.concatenate([c[1] for c in pending])
+                    order = np.argsort(keys, kind="stable")
+                    rec_file.write(records[order].tobytes())
+                    key_file.write(keys[order].tobytes())
+                    start = runs[-1][1] if runs else 0
+                    runs.append((start, start + len(keys)))
+                    pending.clear()
+
+                for label_path in labels:
+                    for chunk in read_table(label_path, chunk_rows):
+                        if dtype is None:
+                            dtype = chunk.dtype
+                            lon, lat = topo2npy.lonlat_names(dtype.names)
+                            lon = self.lon or lon
+                            lat = self.lat or lat
+                        elif chunk.dtype != dtype:
+                            raise ValueError(
+                                f"The table of {label_path} has different "
+                                "columns than the others in the archive."
+                            )
+                        pending.append(
+                            (chunk, topo2npy.morton(chunk[lon], chunk[lat]))
+                        )
+                        if sum(len(c[0]) for c in pending) >= chunk_rows:
+                            write_run()
+                if pending:
+                    write_run()
+
+            if dtype is None:
+                raise ValueError(
+                    f"The tables in {self.directory} don't have any points."
+                )
+
+            total = runs[-1][1]
+            points = np.lib.format.open_memmap(
+                self.points_path, mode="w+", dtype=dtype, shape=(total,)
+            )
+            keys_out = np.lib.format.open_memmap(
+                topo2npy.keys_path(self.points_path), mode="w+",
+                dtype=np.uint32, shape=(total,)
+            )
+            merge_runs(
+                np.memmap(tmp / "runs.rec", dtype=dtype, mode="r"),
+                np.memmap(tmp / "runs.key", dtype=np.uint32, mode="r"),
+                runs, points, keys_out, max(chunk_rows // len(runs), 1024)
+            )
+            points.flush()
+            keys_out.flush()
+            del points, keys_out
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.points_path.with_suffix(".json").write_text(
+            json.dumps(dict(lon=lon, lat=lat, bits=topo2npy.bits))
+        )
+        self.manifest_path.write_text(json.dumps(dict(files=stamp)))
+        print(
+            f"Indexed {total} points from {len(labels)} tables in "
+            f"{time.perf_counter() - start_time:.2f} s"
+        )
+
+    def query(self, minlat, maxlat, westlon, eastlon):
+        """Returns a structured array of the points in the box, which
+        crosses the 0/360 meridian if *westlon* is greater than
+        *eastlon*."""
+        return topo2npy.read_box(
+            self.points_path, minlat, maxlat, westlon, eastlon
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+"""Grids laser altimeter points (like the topo CSV files that getla.py
+retrieves, or .npy files made from them by topo2npy.py) into a GeoTIFF
+DEM over a longitude/latitude box, where each pixel is the mean, median,
+minimum, maximum, or count of the points in it."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The points are read and binned a chunk at a time, so that only the
+# arrays the size of the raster need to stay in memory, however many
+# points there are.  The mean, minimum, maximum, and count are kept as
+# running per-pixel sums and extremes, accumulated with np.bincount()
+# and ufunc.at().  A median needs all of a pixel's values at once, so
+# the (pixel, value) pairs are first spilled to a temporary file for
+# each strip of raster rows, and then each strip is sorted by pixel and
+# value on its own to find the middle values.
+#
+# Pixels without points can optionally be filled from the nearest pixel
+# with points, within some distance, which needs SciPy.
+
+import argparse
+import contextlib
+import json
+import math
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+
+import topo2npy
+
+# Radii, in meters, of the spheres that the data are on.
+radii = dict(MOLA=3396190, LOLA=1737400)
+
+# The ISIS Null value for 32-bit reals.
+nodata = -3.4028226550889045e+38
+
+stats = ("mean", "median", "min", "max", "count")
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+    )
+    parser.add_argument(
+        "-r", "--resolution",
+        type=float,
+        required=True,
+        help="The size of the pixels, in degrees."
+    )
+    parser.add_argument(
+        "-s", "--stat",
+        choices=stats,
+        default="mean",
+        help="How to combine the points in a pixel.  Default: %(default)s"
+    )
+    parser.add_argument(
+        "-f", "--fill",
+        type=float,
+        default=0,
+        help="Fill pixels without points with the value of the nearest "
+             "pixel with points, if it is within this many pixels."
+    )
+    parser.add_argument(
+        "-c", "--column",
+        help="The name of the column to grid.  Default is the first column "
+             "with 'topo' in its name, or else 'radius'."
+    )
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=radii["MOLA"],
+        help="The radius of the body, for the GeoTIFF's coordinate "
+             "reference system.  Default: %(default)s"
+    )
+    parser.add_argument(
+        "-b", "--box",
+        help="A W/E/S/N string of the DEM extent.  Default is the extent "
+             "of the points."
+    )
+    parser.add_argument(
+        "points",
+        type=Path,
+        help="A topo CSV file, or a .npy file made by topo2npy.py."
+    )
+    parser.add_argument(
+        "output",
+        type=Path,
+        help="The GeoTIFF to write."
+    )
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    args = parser.parse_args()
+
+    if args.box is None:
+        box = extent(args.points)
+    else:
+        west, east, south, north = (float(x) for x in args.box.split("/"))
+        box = (south, north, west, east)
+
+    grid_file(
+        args.points, args.output, box, args.resolution, stat=args.stat,
+        fill=args.fill, column=args.column, radius=args.radius
+    )
+
+
+def value_name(names):
+    """Returns the name of the topography column in the list of
+    *names*."""
+    for word in ("topo", "radius"):
+        for n in names:
+            if word in n.casefold():
+                return n
+    raise ValueError(f"Could not find a topography column in {names}")
+
+
+class Grid:
+    """The pixels of a longitude/latitude raster over a box.
+
+    :ivar west: The western edge of the raster, in degrees.
+    :ivar north: The northern edge of the raster, in degrees.
+    :ivar res: The size of the pixels, in degrees.
+    :ivar width: The number of columns.
+    :ivar height: The number of rows.
+    """
+
+    def __init__(self, minlat, maxlat, westlon, eastlon, res):
+        self.west = float(westlon)
+        self.north = float(maxlat)
+        self.south = float(minlat)
+        self.res = float(res)
+        self.span = (float(eastlon) - self.west) % 360 or 360
+        self.width = max(math.ceil(self.span / self.res), 1)
+        self.height = max(math.ceil((self.north - self.south) / self.res), 1)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    @property
+    def transform(self):
+        return from_origin(self.west, self.north, self.res, self.res)
+
+    def pixels(self, lon, lat):
+        """Returns a two-tuple of the flat pixel indices of the points,
+        and a boolean array of which points are within the raster (the
+        indices of those that aren't are meaningless)."""
+        dx = np.mod(np.asarray(lon) - self.west, 360)
+        lat = np.asarray(lat)
+        inside = (dx <= self.span) & (lat >= self.south) & (lat <= self.north)
+        col = np.minimum((dx / self.res).astype(np.int64), self.width - 1)
+        row = np.clip(
+            ((self.north - lat) / self.res).astype(np.int64),
+            0, self.height - 1
+        )
+        return row * self.width + col, inside
+
+
+def point_chunks(path, grid, column=None, chunk_rows=1000000):
+    """Yields three-tuples of arrays of the longitude, latitude, and
+    value of up to about *chunk_rows* points at a time, from the topo
+    CSV file or topo2npy.py .npy file at *path*.  Only the points in the
+    *grid* are read from a .npy file."""
+    path = Path(path)
+    if path.suffix == ".npy":
+        meta = json.loads(path.with_suffix(".json").read_text())
+        lon_name, lat_name = meta["lon"], meta["lat"]
+        # Strips of the box, so that only one is in memory at a time.
+        points = np.load(path, mmap_mode="r")
+        strips = max(math.ceil(len(points) / chunk_rows), 1)
+        edges = np.linspace(grid.south, grid.north, strips + 1)
+        for i, (south, north) in enumerate(zip(edges[:-1], edges[1:])):
+            chunk = topo2npy.read_box(
+                path, south, north, grid.west, grid.west + grid.span
+            )
+            if i > 0:
+                # Points on the edges of strips are in both.
+                chunk = chunk[chunk[lat_name] > south]
+            name = column or value_name(chunk.dtype.names)
+            yield chunk[lon_name], chunk[lat_name], chunk[name]
+    else:
+        for chunk in topo2npy.read_csv(path, chunk_rows=chunk_rows):
+            lon_name, lat_name = topo2npy.lonlat_names(chunk.dtype.names)
+            name = column or value_name(chunk.dtype.names)
+            yield chunk[lon_name], chunk[lat_name], chunk[name]
+
+
+def extent(path):
+    """Returns the (minlat, maxlat, westlon, eastlon) extent of the points
+    in the file at *path*, with longitudes from 0 to 360."""
+    box = [np.inf, -np.inf, np.inf, -np.inf]
+    world = Grid(-90, 90, 0, 360, 1)
+    for lon, lat, z in point_chunks(path, world):
+        if len(lon):
+            lon = np.mod(lon, 360)
+            box = [
+                min(box[0], lat.min()), max(box[1], lat.max()),
+                min(box[2], lon.min()), max(box[3], lon.max()),
+            ]
+    return tuple(box)
+
+
+def _medians(pixels, values, size):
+    # Returns the median of the values in each pixel, and their counts.
+    order = np.lexsort((values, pixels))
+    pixels = pixels[order]
+    values = values[order]
+    counts = np.bincount(pixels, minlength=size)
+    starts = np.cumsum(counts) - counts
+    medians = np.full(size, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    medians[has] = (values[lo] + values[hi]) / 2
+    return medians, counts
+
+
+def grid_points(chunks, grid, stat="mean", strip_rows=None):
+    """Returns a two-tuple of the float64 array of the *stat* of the
+    values of the points in each pixel of the *grid* (NaN where there are
+    no points), and the array of the number of points in each, from the
+    (lon, lat, value) *chunks*.
+
+    For the median, the points are spilled to temporary files of
+    *strip_rows* raster rows each (by default, so that there are about 64
+    strips), and each strip is sorted on its own.
+    """
+    if stat not in stats:
+        raise ValueError(f"{stat} is not one of {stats}")
+
+    size = grid.width * grid.height
+    counts = np.zeros(size, dtype=np.int64)
+
+    if stat == "median":
+        if strip_rows is None:
+            strip_rows = max(math.ceil(grid.height / 64), 1)
+        strip_size = strip_rows * grid.width
+        nstrips = math.ceil(grid.height / strip_rows)
+        result = np.full(size, np.nan)
+        pair = np.dtype([("pixel", "i8"), ("value", "f8")])
+        with tempfile.TemporaryDirectory() as tmp, \
+                contextlib.ExitStack() as stack:
+            files = [
+                stack.enter_context(open(Path(tmp) / f"{i}.bin", "wb"))
+                for i in range(nstrips)
+            ]
+            for lon, lat, z in chunks:
+                pixels, inside = grid.pixels(lon, lat)
+                pairs = np.empty(np.count_nonzero(inside), dtype=pair)
+                pairs["pixel"] = pixels[inside]
+                pairs["value"] = np.asarray(z)[inside]
+                strip = pairs["pixel"] // strip_size
+                order = np.argsort(strip, kind="stable")
+                bounds = np.searchsorted(strip[order], np.arange(nstrips + 1))
+                for i in np.nonzero(np.diff(bounds))[0]:
+                    files[i].write(pairs[order[bounds[i]:bounds[i + 1]]].tobytes())
+            for f in files:
+                f.close()
+
+            for i in range(nstrips):
+                pairs = np.fromfile(Path(tmp) / f"{i}.bin", dtype=pair)
+                start = i * strip_size
+                stop = min(start + strip_size, size)
+                medians, n = _medians(
+                    pairs["pixel"] - start, pairs["value"], stop - start
+                )
+                result[start:stop] = medians
+                counts[start:stop] = n
+        return result.reshape(grid.shape), counts.reshape(grid.shape)
+
+    if stat == "mean":
+        acc = np.zeros(size)
+    elif stat == "min":
+        acc = np.full(size, np.inf)
+    elif stat == "max":
+        acc = np.full(size, -np.inf)
+
+    for lon, lat, z in chunks:
+        pixels, inside = grid.pixels(lon, lat)
+        pixels = pixels[inside]
+        values = np.asarray(z, dtype=float)[inside]
+        counts += np.bincount(pixels, minlength=size)
+        if stat == "mean":
+            acc += np.bincount(pixels, weights=values, minlength=size)
+        elif stat == "min":
+            np.minimum.at(acc, pixels, values)
+        elif stat == "max":
+            np.maximum.at(acc, pixels, values)
+
+    if stat == "count":
+        result = counts.astype(float)
+    else:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = acc / counts if stat == "mean" else acc
+        result[counts == 0] = np.nan
+    return result.reshape(grid.shape), counts.reshape(grid.shape)
+
+
+def fill_nearest(values, distance):
+    """Returns a copy of the 2D *values* array with its NaN pixels filled
+    with the value of the nearest non-NaN pixel, where that pixel is
+    within *distance* pixels."""
+    try:
+        from scipy import ndimage
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError("Filling pixels needs the scipy library.")
+
+    empty = np.isnan(values)
+    if empty.all() or not empty.any():
+        return values.copy()
+    dist, (rows, cols) = ndimage.distance_transform_edt(
+        empty, return_indices=True
+    )
+    filled = values[rows, cols]
+    filled[empty & (dist > distance)] = np.nan
+    return filled
+
+
+def write_geotiff(path, values, grid, radius, stat="mean"):
+    """Writes the 2D *values* array on the *grid* to a GeoTIFF at *path*,
+    with a longitude/latitude coordinate reference system on a sphere of
+    *radius* meters."""
+    profile = dict(
+        driver="GTiff",
+        width=grid.width,
+        height=grid.height,
+        count=1,
+        crs=CRS.from_proj4(f"+proj=longlat +R={radius} +no_defs"),
+        transform=grid.transform,
+        tiled=True,
+        compress="deflate",
+    )
+    if stat == "count":
+        data = values.astype(rasterio.uint32)
+        profile.update(dtype=rasterio.uint32)
+    else:
+        data = np.where(np.isnan(values), nodata, values).astype(
+            rasterio.float32
+        )
+        profile.update(dtype=rasterio.float32, nodata=nodata)
+
+    with rasterio.Env():
+        with rasterio.open(path, 'w', **profile) as dst:
+            dst.write(data, 1)
+
+
+def grid_file(
+    points, output, box, res, stat="mean", fill=0, column=None,
+    radius=radii["MOLA"], chunk_rows=1000000
+):
+    """Grids the points in the topo CSV or topo2npy.py .npy file *points*
+    into the GeoTIFF *output* over the (minlat, maxlat, westlon, eastlon)
+    *box*, with pixels *res* degrees on a side, and returns the path of
+    *output*."""
+    grid = Grid(*box, res)
+    values, counts = grid_points(
+        point_chunks(points, grid, column, chunk_rows), grid, stat
+    )
+    if fill and stat != "count":
+        values = fill_nearest(values, fill)
+    write_geotiff(output, values, grid, radius, stat)
+    print(
+        f"Wrote {grid.width} x {grid.height} {stat} DEM of "
+        f"{counts.sum()} points to {output}"
+    )
+    return Path(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Reads just the PVL label from the start of an ISIS cube or PDS3 file,
+so that getting the label of a multi-gigabyte file takes no longer than
+that of a small one.  Prints the label of the given file."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# pvl.load() reads the whole file before it parses the label at the
+# start of it.  Both ISIS cube labels and PDS3 labels end with a line
+# that is just END (or End), and the rest of an ISIS cube's label area
+# is NUL bytes, so the file is read in chunks only until one of those
+# is found.
+
+import argparse
+import re
+import sys
+
+import pvl
+
+# A line that is only END, in any case, with optional trailing spaces.
+# The line ending is required, since the end of a chunk may fall just
+# after the End of an End_Group or End_Object; an END line at the very
+# end of the file is found by reaching the end of the file.
+end_line = re.compile(rb"^[ \t]*END[ \t]*\r?\n", re.IGNORECASE | re.MULTILINE)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+    )
+    parser.add_argument(
+        "file",
+        help="An ISIS cube or PDS3 file with an attached label."
+    )
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    args = parser.parse_args()
+
+    print(pvl.dumps(read_label(args.file)))
+
+
+def label_bytes(path, chunk_size=65536, limit=64 * 2 ** 20):
+    """Returns the bytes of the label at the start of the file at *path*,
+    up to and including its END line, read *chunk_size* bytes at a time.
+    Raises ValueError if no end of the label is found in the first
+    *limit* bytes."""
+    with open(path, "rb") as f:
+        data = f.read(chunk_size)
+        start = 0
+        while True:
+            match = end_line.search(data, start)
+            if match is not None:
+                return data[:match.end()]
+            nul = data.find(b"\0", start)
+            if nul != -1:
+                return data[:nul]
+
+            more = f.read(chunk_size)
+            if not more:
+                return data
+            if len(data) >= limit:
+                raise ValueError(
+                    f"Could not find the end of the label in the first "
+                    f"{len(data)} bytes of {path}"
+                )
+            # The last line may be only partly read, so start looking
+            # again from its start.
+            start = data.rfind(b"\n") + 1
+            data += more
+
+
+def read_label(path, **kwargs):
+    """Returns the parsed PVL label of the file at *path*, like
+    pvl.load(), but reads only the label from the file.  Any *kwargs* are
+    passed to label_bytes()."""
+    return pvl.loads(label_bytes(path, **kwargs).decode("latin-1"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
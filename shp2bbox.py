@@ -4,8 +4,6 @@
 # Copyright 2017-2021, Ross A. Beyer (rbeyer@seti.org)
 # The functions orientation(), hulls(), rotatingCalipers(), and diameter()
 #    are Copyright 2002, David Eppstein, under a Python Software License.
-# The function haversine() is derived from algorithms which
-#   are Copyright 2002-2017, Chris Veness, under an MIT license
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -31,10 +29,16 @@
 import argparse
 import math
 import os
+import resource
+import struct
 import sys
 from pathlib import Path
+
+import numpy as np
 from osgeo import ogr, osr
-from geopy import distance
+
+import geodesy
+import strtree
 
 # The next four functions (orientation, hulls, rotatingCalipers, and
 # diameter) are from David Eppstein at
@@ -99,22 +103,185 @@ def diameter(Points):
     return diam, pair
 
 
-def haversine(lon1, lat1, lon2, lat2, radius):
-    # The material from which this haversine() function was created is
-    # Copyright 2002-2017 by Chris Veness under an MIT license, and is
-    # available on his website at:
-    # http://www.movable-type.co.uk/scripts/latlong.html
-    phi1 = math.radians(float(lat1))
-    phi2 = math.radians(float(lat2))
-    dlat = math.radians(float(lat2) - float(lat1))
-    dlon = math.radians(float(lon2) - float(lon1))
+def lonlat_array(geom, ct):
+    '''Returns an (N, 2) array of the vertices of the point-sequence
+    geometry (a ring, line, or point) transformed by ct.'''
+    points = geom.GetPoints()
+    if not points:
+        return np.empty((0, 2))
+    return np.array(ct.TransformPoints(points))[:, :2]
+
+
+def geometry_parts(geom, ct):
+    '''Returns a list of the parts of the geometry, where each part is a
+    list of (N, 2) lon/lat arrays, one per ring.  The geometry itself is
+    not modified.'''
+    if geom.GetGeometryCount() == 0:
+        return [[lonlat_array(geom, ct)]]
+
+    if ogr.GT_Flatten(geom.GetGeometryType()) == ogr.wkbPolygon:
+        return [[
+            lonlat_array(geom.GetGeometryRef(i), ct)
+            for i in range(geom.GetGeometryCount())
+        ]]
+
+    parts = []
+    for i in range(geom.GetGeometryCount()):
+        parts.extend(geometry_parts(geom.GetGeometryRef(i), ct))
+    return parts
+
+
+class CoordinateBuffer:
+    '''A reusable float64 array for holding the coordinates of one
+    geometry at a time, which only grows when a geometry needs more
+    room than it has.'''
+
+    def __init__(self, size=65536):
+        self.array = np.empty(size)
+
+    def reserve(self, size):
+        if size > len(self.array):
+            self.array = np.empty(max(size, 2 * len(self.array)))
+        return self.array
+
+
+def wkb_parts(wkb, buffer):
+    '''Parses the WKB bytes of a geometry into the CoordinateBuffer, and
+    returns a two-tuple of the parts of the geometry (as in
+    geometry_parts()) and an (N, 2) array of all of its vertices.  These
+    are all views into the buffer, and so are only valid until it is
+    next used.'''
+    # There can't be more doubles than there are bytes / 8.
+    array = buffer.reserve(len(wkb) // 8)
+    parts = []
+    pos = 0
+    filled = 0
+
+    def read_points(endian, dims, n):
+        # Copies n points of x, y into the buffer, and returns the view.
+        nonlocal pos, filled
+        coords = np.frombuffer(
+            wkb, dtype=endian + "f8", count=n * dims, offset=pos
+        ).reshape(n, dims)
+        pos += 8 * n * dims
+        points = array[filled:filled + 2 * n].reshape(n, 2)
+        points[:] = coords[:, :2]
+        filled += 2 * n
+        return points
+
+    def read_count(endian):
+        nonlocal pos
+        (n,) = struct.unpack_from(endian + "I", wkb, pos)
+        pos += 4
+        return n
+
+    def read_geometry():
+        nonlocal pos
+        endian = "<" if wkb[pos] == 1 else ">"
+        (code,) = struct.unpack_from(endian + "I", wkb, pos + 1)
+        pos += 5
+        # Handles both the old 2.5D flag and the ISO type codes
+        # (+1000 for Z, +2000 for M, +3000 for ZM).
+        dims = 3 if code & 0x80000000 else 2
+        zm, code = divmod(code & 0x0FFFFFFF, 1000)
+        dims += {0: 0, 1: 1, 2: 1, 3: 2}[zm]
+
+        if code == 1:
+            parts.append([read_points(endian, dims, 1)])
+        elif code == 2:
+            parts.append([read_points(endian, dims, read_count(endian))])
+        elif code == 3:
+            parts.append([
+                read_points(endian, dims, read_count(endian))
+                for _ in range(read_count(endian))
+            ])
+        elif code in (4, 5, 6, 7):
+            for _ in range(read_count(endian)):
+                read_geometry()
+        else:
+            raise ValueError(f"Can't parse WKB geometry type {code}.")
+
+    read_geometry()
+    return parts, array[:filled].reshape(-1, 2)
+
+
+def query_geometry(bbox=None, within=None):
+    '''Returns an OGR geometry in longitude and latitude from a W/E/S/N
+    string or from the path to a file containing WKT, or None if neither
+    is given.'''
+    if bbox is not None:
+        west, east, south, north = (float(x) for x in bbox.split("/"))
+        return ogr.CreateGeometryFromWkt(
+            f'POLYGON (({west} {south}, {east} {south}, {east} {north}, '
+            f'{west} {north}, {west} {south}))'
+        )
+    if within is not None:
+        return ogr.CreateGeometryFromWkt(Path(within).read_text())
+    return None
+
+
+def envelope_index(layer, path):
+    '''Returns an STRtree of the envelopes of the layer's features, keyed
+    by FID.  The tree is saved next to path, and is only rebuilt if path
+    has changed since then.'''
+    index_path = Path(f"{path}.{layer.GetName()}.strtree.npz")
+    stamp = strtree.source_stamp(path)
+    if index_path.exists():
+        tree, metadata = strtree.STRtree.load(index_path)
+        if metadata == stamp:
+            return tree
+
+    fids = []
+    envelopes = []
+    layer.ResetReading()
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is not None:
+            fids.append(feature.GetFID())
+            envelopes.append(geom.GetEnvelope())
+    tree = strtree.STRtree(envelopes, fids)
+    try:
+        tree.save(index_path, **stamp)
+    except OSError:
+        # Can't write next to the data, so the tree just won't persist.
+        pass
+    return tree
+
+
+def select(layer, path, geom=None, where=None):
+    '''Returns an iterable of the features of the layer that intersect
+    the longitude and latitude geom and satisfy the OGR SQL where clause.
+
+    The filters are pushed into OGR when the layer can apply a spatial
+    filter efficiently.  Otherwise, the candidate features are found with
+    an STRtree of the feature envelopes (see envelope_index()), and only
+    those are read from the layer.'''
+    if geom is not None:
+        layer_srs = layer.GetSpatialRef()
+        if layer_srs is not None:
+            longlat_srs = osr.SpatialReference()
+            longlat_srs.ImportFromProj4('+proj=longlat +a={} +b={}'.format(
+                layer_srs.GetSemiMajor(), layer_srs.GetSemiMinor()
+            ))
+            geom = geom.Clone()
+            geom.Transform(osr.CoordinateTransformation(longlat_srs, layer_srs))
 
-    a = math.pow(math.sin(dlat / 2), 2) + (
-        math.cos(phi1) * math.cos(phi2) * math.pow(math.sin(dlon / 2), 2)
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = radius * c
-    return distance
+    if geom is None or layer.TestCapability(ogr.OLCFastSpatialFilter):
+        layer.SetSpatialFilter(geom)
+        if layer.SetAttributeFilter(where) != 0:
+            raise ValueError(f"Could not apply the attribute filter: {where}")
+        return layer
+
+    fids = envelope_index(layer, path).query(geom.GetEnvelope())
+    if len(fids) == 0:
+        return []
+
+    clause = 'FID IN ({})'.format(', '.join(str(fid) for fid in fids))
+    if where is not None:
+        clause += f' AND ({where})'
+    if layer.SetAttributeFilter(clause) != 0:
+        raise ValueError(f"Could not apply the attribute filter: {where}")
+    return (f for f in layer if f.GetGeometryRef().Intersects(geom))
 
 
 def format_coord(coord, decimals, lon360):
@@ -130,6 +297,195 @@ def format_coord(coord, decimals, lon360):
     return formatted
 
 
+def measure(feature, layer, args, buffer=None):
+    '''Returns a dict with the lines to print for the feature, and the
+    lon/lat endpoints of its longest dimension along with the semi-major
+    and semi-minor axes of its body.
+
+    If a CoordinateBuffer is given, the feature's coordinates are read
+    into it, rather than into new arrays.'''
+    lines = []
+    try:
+        name = feature.GetField("Name")
+        try:
+            desc = feature.GetField("Descriptor")
+        except KeyError:
+            desc = ''
+    except ValueError:
+        name = 'Feature'
+        for i in range(layer.GetLayerDefn().GetFieldCount()):
+            name += ' ' + str(feature.GetField(i))
+        desc = ''
+    geom = feature.GetGeometryRef()
+    spatialRef = geom.GetSpatialReference()
+    if geom.HasCurveGeometry():
+        # Circular strings, compound curves, curve polygons, and the
+        # like are measured as their approximations by line segments.
+        geom = geom.GetLinearGeometry()
+
+    longlat_srs = osr.SpatialReference()
+    longlat_srs.ImportFromProj4('+proj=longlat +a={} +b={}'.format(
+        spatialRef.GetSemiMajor(), spatialRef.GetSemiMinor()
+    ))
+    ct = osr.CoordinateTransformation(spatialRef, longlat_srs)
+
+    # This may be problematic for concave shapes.
+    # Trent recommends using a geodesic centroid,
+    # for now, we'll just do it like this.  Trent says:
+    # See Jenness:
+    # http://www.jennessent.com/downloads/Graphics_Shapes_Online.pdf
+    # although this post has some concerns on how Jenness does it:
+    # https://gis.stackexchange.com/questions/43505/calculating-a-spherical-polygon-centroid
+    centroid_lon_lat = ct.TransformPoint(geom.Centroid().GetX(),
+                                         geom.Centroid().GetY())
+
+    envelope = geom.GetEnvelope()
+    bbox_lon_lat_min = ct.TransformPoint(envelope[0], envelope[2])
+    bbox_lon_lat_max = ct.TransformPoint(envelope[1], envelope[3])
+
+    lines.append(f'{name} {desc}:')
+    # print geom.Centroid()
+    centroid = format_coord(centroid_lon_lat, args.decimals, args.lon360)
+    min_point = format_coord(bbox_lon_lat_min, args.decimals, args.lon360)
+    max_point = format_coord(bbox_lon_lat_max, args.decimals, args.lon360)
+    if args.parameters:
+        lines.append(f'Center latitude: {centroid[1]}')
+        lines.append(f'Center longitude: {centroid[0]}')
+        lines.append(f'Northernmost latitude: {max_point[1]}')
+        lines.append(f'Southernmost latitude: {min_point[1]}')
+        lines.append(f'Westernmost longitude: {min_point[0]}')
+        lines.append(f'Easternmost longitude: {max_point[0]}')
+    else:
+        lines.append(f'        Centroid: {centroid[0]}, {centroid[1]}')
+        # print envelope
+        lines.append('    Bounding box: {}, {} and {}, {}'.format(min_point[0],
+                                                               min_point[1],
+                                                               max_point[0],
+                                                               max_point[1]))
+
+    format_str = "{:." + str(args.decimals) + "f}"
+
+    # The measurements are computed directly on the lon/lat
+    # coordinates of every ring of every part of the geometry.
+    a = spatialRef.GetSemiMajor()
+    b = spatialRef.GetSemiMinor()
+    parts = None
+    if buffer is not None:
+        try:
+            parts, lonlat = wkb_parts(geom.ExportToWkb(), buffer)
+        except ValueError:
+            # Any other geometry types that wkb_parts() does not parse
+            # (like triangles or TINs) are left to OGR, below.
+            parts = None
+        else:
+            if not spatialRef.IsGeographic():
+                # Transforming in place also updates the views in parts.
+                lonlat[:] = np.array(ct.TransformPoints(lonlat))[:, :2]
+    if parts is None:
+        parts = geometry_parts(geom, ct)
+        lonlat = geodesy.vertices(parts)
+    if ogr.GT_Flatten(geom.GetGeometryType()) in (
+        ogr.wkbPolygon, ogr.wkbMultiPolygon
+    ):
+        area = geodesy.area(parts, a, b)
+    else:
+        area = 0
+
+    area_str = 'Area: ' + format_str.format(area / 1000000) + ' km^2'
+    perim_str = 'Perimeter: ' + format_str.format(
+        geodesy.perimeter(parts, a, b) / 1000
+    ) + ' km'
+    if args.parameters:
+        lines.append(area_str)
+        lines.append(perim_str)
+    else:
+        lines.append('            ' + area_str)
+        lines.append('       ' + perim_str)
+
+    if args.exact:
+        # The longest geodesic between any two of the vertices.
+        dist, i, j = geodesy.geodesic_diameter(lonlat, a, b)
+    else:
+        # The longest dimension is found in an orthographic projection
+        # centered at the centroid, and the vertex indices are carried
+        # along so that the lon/lat of the pair can be looked up.
+        xy = geodesy.orthographic(
+            lonlat, centroid_lon_lat[0], centroid_lon_lat[1], a
+        )
+        diam, pair = diameter(
+            [(x, y, i) for i, (x, y) in enumerate(xy.tolist())]
+        )
+        lines.append(
+            'Orthographic dist: ' +
+            format_str.format((math.sqrt(diam)) / 1000) + ' km'
+        )
+        i, j = pair[0][2], pair[1][2]
+
+    return dict(
+        lines=lines,
+        pair=(*lonlat[i], *lonlat[j]),
+        a=a,
+        b=b
+    )
+
+
+def records(features, layer, args, buffer=None):
+    '''Yields the record from measure() for each of the features as soon
+    as it has been measured.'''
+    for feature in features:
+        yield measure(feature, layer, args, buffer)
+
+
+def report(records, args, batch=64):
+    '''Prints the records from measure() as they arrive, a batch at a time,
+    computing the Haversine and Geodesic distances of the longest
+    dimensions of each batch at once.  Only one batch of records is held
+    at a time.'''
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == batch:
+            report_batch(chunk, args)
+            chunk.clear()
+    report_batch(chunk, args)
+
+
+def report_batch(records, args):
+    '''Prints a list of records from measure(), computing the Haversine
+    and Geodesic distances of all of their longest dimensions at once.'''
+    if not records:
+        return
+
+    lon1, lat1, lon2, lat2 = np.array([r["pair"] for r in records]).T
+    haverdists, geodists = geodesy.distances(
+        lon1, lat1, lon2, lat2,
+        np.array([r["a"] for r in records]),
+        np.array([r["b"] for r in records])
+    )
+
+    format_str = "{:." + str(args.decimals) + "f}"
+    for r, haverdist, geodist in zip(records, haverdists, geodists):
+        for line in r["lines"]:
+            print(line)
+        print('Haversine dist: ' + format_str.format(haverdist / 1000) + ' km')
+        print('Geodesic dist: ' + format_str.format(geodist / 1000) + ' km')
+    sys.stdout.flush()
+
+
+def stream(layer, features, args, batch=1024):
+    '''Measures and reports the features a batch at a time, reading
+    each feature's coordinates into the same CoordinateBuffer, so that
+    memory use does not grow with the number of features.'''
+    report(records(features, layer, args, CoordinateBuffer()), args, batch)
+
+
+def peak_rss():
+    '''Returns the peak resident set size of this process in bytes.'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -144,10 +500,44 @@ def main():
         '-p', '--parameters', action="store_true",
         help="List parameters out atomically."
     )
-    parser.add_argument('shpfile', help="shape files", nargs='+')
+    parser.add_argument(
+        '-s', '--stream', action="store_true",
+        help="Process features in batches with bounded memory, rather than "
+             "holding them all, and report the peak memory use."
+    )
+    parser.add_argument(
+        '-x', '--exact', action="store_true",
+        help="Find the longest dimension as the longest geodesic between "
+             "any two vertices, rather than in an orthographic projection "
+             "about the centroid."
+    )
+    parser.add_argument(
+        '-b', '--bbox',
+        help="Only report features that intersect this W/E/S/N longitude "
+             "and latitude box."
+    )
+    parser.add_argument(
+        '-w', '--within', type=Path,
+        help="Only report features that intersect the geometry in this "
+             "file of longitude and latitude WKT."
+    )
+    parser.add_argument(
+        '--where',
+        help="Only report features that satisfy this OGR SQL attribute "
+             "filter, like \"Diameter > 10\"."
+    )
+    parser.add_argument(
+        'shpfile', nargs='+',
+        help="Shapefiles, or any other OGR-readable vector files, like "
+             "GeoPackage or GeoJSON."
+    )
 
     args = parser.parse_args()
 
+    if args.bbox is not None and args.within is not None:
+        parser.error("Only one of --bbox or --within may be given.")
+    query = query_geometry(args.bbox, args.within)
+
     for shp in args.shpfile:
         shp_path = Path(shp)
         if not shp_path.exists():
@@ -159,168 +549,26 @@ def main():
         # driver = ogr.GetDriverByName("ESRI Shapefile")
         # dataSource = driver.Open(str(shp_path), 0)
         dataSource = ogr.Open(str(shp_path), 0)
-        layer = dataSource.GetLayer()
-
-        for feature in layer:
-            try:
-                name = feature.GetField("Name")
-                try:
-                    desc = feature.GetField("Descriptor")
-                except KeyError:
-                    desc = ''
-            except ValueError:
-                name = 'Feature'
-                for i in range(layer.GetLayerDefn().GetFieldCount()):
-                    name += ' ' + str(feature.GetField(i))
-                desc = ''
-            geom = feature.GetGeometryRef()
-            spatialRef = geom.GetSpatialReference()
-
-            longlat_srs = osr.SpatialReference()
-            longlat_srs.ImportFromProj4('+proj=longlat +a={} +b={}'.format(
-                spatialRef.GetSemiMajor(), spatialRef.GetSemiMinor()
-            ))
-            ct = osr.CoordinateTransformation(spatialRef, longlat_srs)
-
-            # This may be problematic for concave shapes.
-            # Trent recommends using a geodesic centroid,
-            # for now, we'll just do it like this.  Trent says:
-            # See Jenness:
-            # http://www.jennessent.com/downloads/Graphics_Shapes_Online.pdf
-            # although this post has some concerns on how Jenness does it:
-            # https://gis.stackexchange.com/questions/43505/calculating-a-spherical-polygon-centroid
-            centroid_lon_lat = ct.TransformPoint(geom.Centroid().GetX(),
-                                                 geom.Centroid().GetY())
-
-            envelope = geom.GetEnvelope()
-            bbox_lon_lat_min = ct.TransformPoint(envelope[0], envelope[2])
-            bbox_lon_lat_max = ct.TransformPoint(envelope[1], envelope[3])
-
-            print(f'{name} {desc}:')
-            # print geom.Centroid()
-            centroid = format_coord(centroid_lon_lat, args.decimals, args.lon360)
-            min_point = format_coord(bbox_lon_lat_min, args.decimals, args.lon360)
-            max_point = format_coord(bbox_lon_lat_max, args.decimals, args.lon360)
-            if args.parameters:
-                print(f'Center latitude: {centroid[1]}')
-                print(f'Center longitude: {centroid[0]}')
-                print(f'Northernmost latitude: {max_point[1]}')
-                print(f'Southernmost latitude: {min_point[1]}')
-                print(f'Westernmost longitude: {min_point[0]}')
-                print(f'Easternmost longitude: {max_point[0]}')
+        if dataSource is None:
+            raise ValueError(f"OGR could not open {shp_path}")
+
+        for i in range(dataSource.GetLayerCount()):
+            layer = dataSource.GetLayer(i)
+            features = select(layer, shp_path, query, args.where)
+            if args.stream:
+                stream(layer, features, args)
             else:
-                print(f'        Centroid: {centroid[0]}, {centroid[1]}')
-                # print envelope
-                print('    Bounding box: {}, {} and {}, {}'.format(min_point[0],
-                                                                   min_point[1],
-                                                                   max_point[0],
-                                                                   max_point[1]))
-
-            format_str = "{:." + str(args.decimals) + "f}"
-
-            # We are going to transform the geometry to a projection centered at the
-            # centroid, so that we can more accurately compute the area and longest dimension:
-            xform_srs = osr.SpatialReference()
-            xform_srs.ImportFromProj4(
-                '+proj=ortho +lat_0={} +lon_0={} +a={} +b={}'.format(
-                    centroid_lon_lat[1],
-                    centroid_lon_lat[0],
-                    spatialRef.GetSemiMajor(),
-                    spatialRef.GetSemiMinor()
-                )
-            )
-            # xform_srs.ImportFromProj4('+proj=sinu +lat_0='+str(centroid_lon_lat[1])+' +lon_0='+str(centroid_lon_lat[0])+' +a='+str(spatialRef.GetSemiMajor())+' +b='+str(spatialRef.GetSemiMinor()))
-            xform = osr.CoordinateTransformation(spatialRef, xform_srs)
+                report(records(features, layer, args), args)
+            layer = None
+            features = None
 
-            geom.Transform(xform)
+        dataSource = None
 
-            area_str = 'Area: ' + format_str.format(geom.GetArea() / 1000000) + ' km^2'
-            if args.parameters:
-                print(area_str)
-            else:
-                print('            ' + area_str)
-
-            if geom.GetGeometryName() == "LINESTRING":
-                ring = geom
-            else:
-                ring = geom.GetGeometryRef(0)
-
-            pairs = []
-            for p in range(ring.GetPointCount()):
-                x, y, z = ring.GetPoint(p)
-                pairs.append([x, y])
-
-            diam, pair = diameter(pairs)
-            print('Orthographic dist: ' + format_str.format((math.sqrt(diam)) /
-                                                            1000) + ' km')
-
-            xtoll = osr.CoordinateTransformation(xform_srs, longlat_srs)
-
-            # geom.Transform( xtoll )
-            # geom.Transform( ct )
-            # llring = geom.GetGeometryRef(0)
-            # llpairs = []
-            # for p in range( llring.GetPointCount() ):
-            #     x, y, z = llring.GetPoint(p)
-            #     llpairs.append( [x, y] )
-
-            # lldiam, llpair = diameter( llpairs )
-
-            llpoint1 = xtoll.TransformPoint(pair[0][0], pair[0][1])
-            llpoint2 = xtoll.TransformPoint(pair[1][0], pair[1][1])
-
-            # print(f'llpoint1: {llpoint1}')
-            # print(f'llpoint2: {llpoint2}')
-
-            haverdist = haversine(
-                llpoint1[0], llpoint1[1], llpoint2[0], llpoint2[1],
-                spatialRef.GetSemiMajor()
+        if args.stream:
+            print(
+                f"Peak RSS after {shp_path}: {peak_rss() / 2**20:.1f} MiB",
+                file=sys.stderr
             )
-            print('Haversine dist: ' + format_str.format(haverdist / 1000) + ' km')
-
-            # print('Vincenty dist: ' + str(distance.vincenty((llpoint1[1], llpoint1[0]),
-            print('Geodesic dist: ' + str(
-                distance.geodesic(
-                    (llpoint1[1], llpoint1[0]),
-                    (llpoint2[1], llpoint2[0]),
-                    ellipsoid=(
-                        spatialRef.GetSemiMajor() / 1000,
-                        spatialRef.GetSemiMinor() / 1000,
-                        spatialRef.GetInvFlattening()
-                    )
-                )
-            ))
-            # print 'Vincenty dist: '+format_str.format( distance.vincenty( llpair[0], llpair[1], ellipsoid=(spatialRef.GetSemiMajor(), spatialRef.GetSemiMinor(),spatialRef.GetInvFlattening()) )/1000 )+' km'
-            # print(llpoint1)
-            # print(llpoint2)
-
-            # # Brute force to find the longest span:
-            # geom.Transform(ct)
-
-            # ring = geom.GetGeometryRef(0)
-            # pairs = []
-            # for p in range( ring.GetPointCount() ):
-            #     x, y, z = ring.GetPoint(p)
-            #     pairs.append( [x, y] )
-
-            # max_vincenty = 0
-            # pair_vincenty = []
-            # max_haver = 0
-            # pair_vincenty = []
-            # for p in pairs:
-            #     for q in pairs:
-            #         l_vincenty = distance.vincenty( p, q, ellipsoid=(spatialRef.GetSemiMajor()/1000, spatialRef.GetSemiMinor()/1000,spatialRef.GetInvFlattening()) ).km
-            #         if l_vincenty > max_vincenty:
-            #             max_vincenty = l_vincenty
-            #             pair_vincenty = (p,q)
-            #         l_haver = haversine( p[0], p[1], q[0], q[1], spatialRef.GetSemiMajor() )/1000
-            #         if l_haver> max_haver:
-            #             max_haver= l_haver
-            #             pair_haver = (p,q)
-            # print 'Max Haversine: '+str(max_haver)
-            # print pair_haver
-            # print 'Max Vincenty: '+str(max_vincenty)
-            # print pair_vincenty
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""Looks through the pixels of an ISIS cube for the special pixel values
+that ISIS uses for low and high instrument and representation saturation
+(Lis, Lrs, His, and Hrs).  Prints the kind and location of the first one
+found, and exits with a non-zero status if there is one."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This does the job of running ISIS stats and looking at its
+# LisPixels, LrsPixels, HisPixels, and HrsPixels counts, but without
+# needing ISIS, and it can stop as soon as it finds one.  The core of
+# the cube is memory-mapped using the Core and Pixels information in its
+# label, and read a block at a time.
+#
+# The special values are stored as raw values in the cube, so they are
+# checked as unsigned integers of the same size as the pixels (for Real
+# pixels, these are the bit patterns of the special float values).  In
+# that form each kind of special pixel is a single value, and the values
+# for a pixel type fall in one or two runs of consecutive integers, so
+# a block can be checked with one or two vectorized comparisons.  The
+# Null value is not one of these, and is not looked for.
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import readlabel
+
+# For each ISIS pixel type, the size in bytes of a pixel, and the raw
+# values, as unsigned integers of that size, of each kind of special
+# pixel that pixel type has.
+special_values = {
+    "UnsignedByte": (1, {"Hrs": 255}),
+    "SignedWord": (
+        2, {"Lrs": 0x8001, "Lis": 0x8002, "His": 0x8003, "Hrs": 0x8004}
+    ),
+    "UnsignedWord": (2, {"Lrs": 1, "Lis": 2, "His": 65534, "Hrs": 65535}),
+    "SignedInteger": (
+        4,
+        {
+            "Lrs": 0x80000001,
+            "Lis": 0x80000002,
+            "His": 0x80000003,
+            "Hrs": 0x80000004
+        }
+    ),
+    "UnsignedInteger": (
+        4,
+        {"Lrs": 1, "Lis": 2, "His": 0xFFFFFFFE, "Hrs": 0xFFFFFFFF}
+    ),
+    "Real": (
+        4,
+        {
+            "Lrs": 0xFF7FFFFC,
+            "Lis": 0xFF7FFFFD,
+            "His": 0xFF7FFFFE,
+            "Hrs": 0xFF7FFFFF
+        }
+    ),
+}
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+    )
+    parser.add_argument(
+        "cube",
+        help="An ISIS cube."
+    )
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    args = parser.parse_args()
+
+    found = first_special(args.cube)
+    if found is None:
+        print(f"{args.cube} has no Lis, Lrs, His, or Hrs pixels.")
+        return 0
+
+    print(
+        "{} has {}Pixels, the first at sample {}, line {}, band {}.".format(
+            args.cube, *found
+        )
+    )
+    return 1
+
+
+def _runs(values):
+    """Returns the *values* as a list of (low, high) tuples, one for each
+    run of consecutive integers in them."""
+    runs = list()
+    for v in sorted(values):
+        if runs and v == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], v)
+        else:
+            runs.append((v, v))
+    return runs
+
+
+def _mask(block, runs):
+    """Returns a boolean array that is True where the unsigned integers
+    in *block* fall in any of the (low, high) *runs*."""
+    mask = None
+    for low, high in runs:
+        # Unsigned subtraction wraps anything below low around to a big
+        # number, so this is low <= block <= high in one comparison.
+        m = (block - block.dtype.type(low)) <= high - low
+        mask = m if mask is None else mask | m
+    return mask
+
+
+def core_array(path, label=None):
+    """Returns a read-only memory map of the pixels of the ISIS cube at
+    *path* as unsigned integers of the same size as its pixels, along
+    with a dictionary of the special pixel values for its pixel type.
+
+    For a BandSequential cube the array has the shape
+    (bands, lines, samples), and for a Tile cube it has the shape
+    (bands, tile rows, tile columns, tile lines, tile samples), where
+    the tiles on the right and bottom edges may extend past the edges of
+    the image.  The *label* is read from the cube if not given.  For a
+    cube with a detached label, the pixels are read from the file that
+    its ^Core points to."""
+    if label is None:
+        label = readlabel.read_label(path)
+    isiscube = label["IsisCube"]
+    core = isiscube["Core"]
+
+    if "StartByte" in core:
+        core_path = path
+        offset = core["StartByte"] - 1
+    elif "^Core" in isiscube:
+        # The core is all of the file, which is next to the label.
+        core_path = Path(path).parent / isiscube["^Core"]
+        offset = 0
+    else:
+        raise ValueError(f"Could not find the core of {path}.")
+
+    pixel_type = core["Pixels"]["Type"]
+    try:
+        size, specials = special_values[pixel_type]
+    except KeyError:
+        raise ValueError(
+            f"Pixels of type {pixel_type} in {path} are not supported."
+        ) from None
+
+    order = "<" if core["Pixels"].get("ByteOrder", "Lsb") == "Lsb" else ">"
+    dtype = np.dtype(f"{order}u{size}")
+
+    dims = core["Dimensions"]
+    samples = dims["Samples"]
+    lines = dims["Lines"]
+    bands = dims["Bands"]
+
+    fmt = core.get("Format", "Tile")
+    if fmt == "BandSequential":
+        shape = (bands, lines, samples)
+    elif fmt == "Tile":
+        tile_samples = core["TileSamples"]
+        tile_lines = core["TileLines"]
+        shape = (
+            bands,
+            -(-lines // tile_lines),
+            -(-samples // tile_samples),
+            tile_lines,
+            tile_samples
+        )
+    else:
+        raise ValueError(f"The {fmt} format of {path} is not supported.")
+
+    array = np.memmap(
+        core_path, dtype=dtype, mode="r", offset=offset, shape=shape
+    )
+    return array, specials
+
+
+def first_special(path, label=None, block_bytes=16 * 2 ** 20):
+    """Returns a tuple of the kind ("Lis", "Lrs", "His", or "Hrs") and
+    the one-based sample, line, and band of the first Lis, Lrs, His, or
+    Hrs pixel found in the ISIS cube at *path*, or None if there are
+    none.  Pixels are read in blocks of about *block_bytes* bytes (or a
+    row of tiles, for a Tile cube), and reading stops at the first block
+    with one of them in it.
+
+    Pixels are looked through in the order they are stored, so for a
+    Tile cube, the pixel returned may not be the first in sample, line,
+    band order.  The *label* is read from the cube if not given."""
+    if label is None:
+        label = readlabel.read_label(path)
+    array, specials = core_array(path, label)
+    runs = _runs(specials.values())
+    kinds = {v: k for k, v in specials.items()}
+
+    if array.ndim == 3:
+        bands, lines, samples = array.shape
+        flat = array.reshape(-1)
+        step = max(1, block_bytes // array.itemsize)
+        for start in range(0, flat.size, step):
+            hits = np.flatnonzero(_mask(flat[start:start + step], runs))
+            if hits.size:
+                i = start + hits[0]
+                b, rest = divmod(int(i), lines * samples)
+                line, sample = divmod(rest, samples)
+                return kinds[int(flat[i])], sample + 1, line + 1, b + 1
+        return None
+
+    dims = label["IsisCube"]["Core"]["Dimensions"]
+    lines = dims["Lines"]
+    samples = dims["Samples"]
+    bands, rows, cols, tile_lines, tile_samples = array.shape
+    last_samples = samples - (cols - 1) * tile_samples
+
+    # A row of tiles at a time, less the parts of the tiles past the
+    # right and bottom edges of the image, which ISIS fills with Null.
+    for b in range(bands):
+        for r in range(rows):
+            valid_lines = min(tile_lines, lines - r * tile_lines)
+            tiles = array[b, r, :, :valid_lines]
+            for c0, block in (
+                (0, tiles[:cols - 1]),
+                (cols - 1, tiles[cols - 1:, :, :last_samples])
+            ):
+                mask = _mask(block, runs)
+                if mask.any():
+                    c, line, sample = np.unravel_index(
+                        np.argmax(mask), mask.shape
+                    )
+                    return (
+                        kinds[int(block[c, line, sample])],
+                        (c0 + c) * tile_samples + sample + 1,
+                        r * tile_lines + line + 1,
+                        b + 1
+                    )
+    return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""A static, packed R-tree over rectangle envelopes, built with the
+Sort-Tile-Recursive (STR) algorithm, which can be saved to and loaded
+from disk."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Envelopes are given in the same (minx, maxx, miny, maxy) order that
+# OGR's Geometry.GetEnvelope() returns them in.
+#
+# The STR algorithm is from Leutenegger, Lopez, and Edgington (1997),
+# STR: A Simple and Efficient Algorithm for R-Tree Packing.  Each
+# level of the tree is held as NumPy arrays of node envelopes and of
+# the start and end indices of each node's children in the level below,
+# so that queries are a handful of vectorized operations per level.
+
+import math
+import os
+
+import numpy as np
+
+
+def _str_order(boxes, capacity):
+    # Returns the order in which to pack the boxes into nodes of the
+    # given capacity: sorted into vertical slices by x center, and then
+    # by y center within each slice.
+    n = len(boxes)
+    xc = (boxes[:, 0] + boxes[:, 1]) / 2
+    yc = (boxes[:, 2] + boxes[:, 3]) / 2
+    slices = math.ceil(math.sqrt(math.ceil(n / capacity)))
+    slice_size = slices * capacity
+
+    by_x = np.argsort(xc, kind="stable")
+    slice_of = np.empty(n, dtype=np.int64)
+    slice_of[by_x] = np.arange(n) // slice_size
+    return np.lexsort((yc, slice_of))
+
+
+def _pack(boxes, capacity):
+    # Returns the envelopes and the child start and end indices of the
+    # parent nodes of the boxes, which must already be in STR order.
+    n = len(boxes)
+    start = np.arange(0, n, capacity)
+    end = np.minimum(start + capacity, n)
+    parents = np.column_stack((
+        np.minimum.reduceat(boxes[:, 0], start),
+        np.maximum.reduceat(boxes[:, 1], start),
+        np.minimum.reduceat(boxes[:, 2], start),
+        np.maximum.reduceat(boxes[:, 3], start),
+    ))
+    return parents, start, end
+
+
+def _intersects(boxes, query):
+    return (
+        (boxes[:, 0] <= query[1]) & (boxes[:, 1] >= query[0]) &
+        (boxes[:, 2] <= query[3]) & (boxes[:, 3] >= query[2])
+    )
+
+
+def _expand(start, end):
+    # Returns the concatenation of the ranges [start, end).
+    counts = end - start
+    offsets = np.repeat(start - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
+
+
+class STRtree:
+    """An R-tree packed with the Sort-Tile-Recursive algorithm.
+
+    :ivar ids: The identifiers of the envelopes (for example, OGR FIDs),
+        in the packed order of the leaves.
+    :ivar boxes: The (minx, maxx, miny, maxy) envelopes, in the packed
+        order of the leaves.
+    :ivar levels: A list of (boxes, start, end) arrays for each level of
+        nodes above the leaves, from the bottom to the root.
+    """
+
+    def __init__(self, envelopes, ids=None, capacity=16):
+        envelopes = np.asarray(envelopes, dtype=float).reshape(-1, 4)
+        if ids is None:
+            ids = np.arange(len(envelopes))
+        ids = np.asarray(ids, dtype=np.int64)
+
+        order = _str_order(envelopes, capacity)
+        self.boxes = envelopes[order]
+        self.ids = ids[order]
+        self.levels = list()
+
+        boxes = self.boxes
+        while len(boxes) > 0:
+            parents, start, end = _pack(boxes, capacity)
+            if len(parents) > 1:
+                # The parents of these parents need them in STR order.
+                order = _str_order(parents, capacity)
+                parents, start, end = parents[order], start[order], end[order]
+            self.levels.append((parents, start, end))
+            if len(parents) == 1:
+                break
+            boxes = parents
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, envelope):
+        """Returns an array of the ids whose envelopes intersect the
+        (minx, maxx, miny, maxy) *envelope*, in ascending order."""
+        if not self.levels:
+            return np.empty(0, dtype=np.int64)
+
+        query = np.asarray(envelope, dtype=float)
+        boxes, start, end = self.levels[-1]
+        hits = np.nonzero(_intersects(boxes, query))[0]
+        for boxes, start_below, end_below in reversed(self.levels[:-1]):
+            children = _expand(start[hits], end[hits])
+            hits = children[_intersects(boxes[children], query)]
+            start, end = start_below, end_below
+
+        items = _expand(start[hits], end[hits])
+        items = items[_intersects(self.boxes[items], query)]
+        return np.sort(self.ids[items])
+
+    def save(self, path, **metadata):
+        """Writes the tree to *path* as a NumPy .npz file, along with any
+        scalar *metadata* keyword values."""
+        arrays = dict(boxes=self.boxes, ids=self.ids)
+        for i, (boxes, start, end) in enumerate(self.levels):
+            arrays[f"level{i}_boxes"] = boxes
+            arrays[f"level{i}_start"] = start
+            arrays[f"level{i}_end"] = end
+        for k, v in metadata.items():
+            arrays[f"meta_{k}"] = np.asarray(v)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Returns a two-tuple of the STRtree read from *path* and a dict
+        of the metadata that was saved with it."""
+        with np.load(path) as npz:
+            tree = cls.__new__(cls)
+            tree.boxes = npz["boxes"]
+            tree.ids = npz["ids"]
+            tree.levels = list()
+            i = 0
+            while f"level{i}_boxes" in npz:
+                tree.levels.append((
+                    npz[f"level{i}_boxes"],
+                    npz[f"level{i}_start"],
+                    npz[f"level{i}_end"],
+                ))
+                i += 1
+            metadata = {
+                k[5:]: npz[k].item() for k in npz.files if k.startswith("meta_")
+            }
+        return tree, metadata
+
+
+def source_stamp(path):
+    """Returns a dict of the size and modification time of *path*, to be
+    saved with a tree so that a stale tree can be detected."""
+    st = os.stat(path)
+    return dict(source_size=st.st_size, source_mtime_ns=st.st_mtime_ns)
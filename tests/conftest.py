@@ -0,0 +1,7 @@
+# The scripts are modules at the top of the repository, so make them
+# importable from the tests.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("pvl")
+
+import caption_helper  # noqa: E402
+
+groundpoint = '''Group = GroundPoint
+  NorthAzimuth = 270.5
+  SubSolarGroundAzimuth = 120.25
+End_Group
+End
+'''
+
+
+@pytest.fixture
+def campt(monkeypatch):
+    """A stand-in for kalasiris.campt(), which fails while its *fail*
+    attribute is True, and counts its calls."""
+    def run(path):
+        run.calls += 1
+        if run.fail:
+            raise subprocess.CalledProcessError(1, ["campt"])
+        return subprocess.CompletedProcess(["campt"], 0, stdout=groundpoint)
+
+    run.calls = 0
+    run.fail = False
+    monkeypatch.setitem(
+        sys.modules, "kalasiris", types.SimpleNamespace(campt=run)
+    )
+    return run
+
+
+def test_failures_not_cached(tmp_path, campt):
+    cube = tmp_path / "test.cub"
+    cube.write_bytes(b"cube")
+    with caption_helper.CamptCache(tmp_path / "campt.sqlite") as cache:
+        campt.fail = True
+        assert caption_helper.campt_groundpoint(cube, cache=cache) is None
+        assert caption_helper.campt_groundpoint(cube, cache=cache) is None
+        assert campt.calls == 2
+
+        campt.fail = False
+        for _ in range(2):
+            gp = caption_helper.campt_groundpoint(cube, cache=cache)
+            assert gp["NorthAzimuth"] == 270.5
+        assert campt.calls == 3
+
+
+def test_old_failures_retried(tmp_path, campt):
+    cube = tmp_path / "test.cub"
+    cube.write_bytes(b"cube")
+    with caption_helper.CamptCache(tmp_path / "campt.sqlite") as cache:
+        cache.put(cache.key(cube), "")
+        gp = caption_helper.campt_groundpoint(cube, cache=cache)
+        assert gp["SubSolarGroundAzimuth"] == 120.25
+        assert campt.calls == 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import geodesy
+
+geographiclib = pytest.importorskip("geographiclib.geodesic")
+
+mars_a = 3396190.0
+mars_b = 3376200.0
+
+
+def reference_area(ring, a, b):
+    poly = geographiclib.Geodesic(a, (a - b) / a).Polygon()
+    for lon, lat in ring:
+        poly.AddPoint(lat, lon)
+    return poly.Compute(False, True)[2]
+
+
+@pytest.mark.parametrize("lat", [80, -80, 45])
+@pytest.mark.parametrize("direction", [1, -1])
+def test_polar_cap(lat, direction):
+    lons = np.arange(0, 360, 2.0)[::direction]
+    ring = np.column_stack((lons, np.full(len(lons), float(lat))))
+
+    # On a sphere the edges are the same great circles, so this is exact.
+    assert geodesy.ring_area(ring, mars_a, mars_a) == pytest.approx(
+        reference_area(ring, mars_a, mars_a), rel=1e-9
+    )
+    assert geodesy.ring_area(ring, mars_a, mars_b) == pytest.approx(
+        reference_area(ring, mars_a, mars_b), rel=1e-3
+    )
+
+
+def test_small_ring_unchanged():
+    ring = [(10, 10), (11, 10), (11, 11), (10, 11)]
+    assert geodesy.ring_area(ring, mars_a, mars_a) == pytest.approx(
+        reference_area(ring, mars_a, mars_a), rel=1e-9
+    )
+    assert geodesy.ring_area(ring[::-1], mars_a, mars_a) < 0
+
+
+def test_cap_with_hole():
+    cap = [(lon, 80.0) for lon in range(0, 360, 2)]
+    hole = [(lon, 85.0) for lon in range(0, 360, 2)]
+    expected = (
+        reference_area(cap, mars_a, mars_a)
+        - reference_area(hole, mars_a, mars_a)
+    )
+    assert geodesy.area([[cap, hole]], mars_a, mars_a) == pytest.approx(
+        expected, rel=1e-9
+    )
@@ -0,0 +1,247 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import getla
+
+payload = bytes(range(256)) * 4096
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves the payload, honoring Range requests (unless ignore_range is
+    set), and drops the connection half way through the first *drops*
+    responses."""
+
+    protocol_version = "HTTP/1.1"
+    drops = 0
+    ignore_range = False
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        rng = self.headers.get("Range")
+        type(self).requests.append(rng)
+        start = 0
+        if rng and not self.ignore_range:
+            start = int(re.match(r"bytes=(\d+)-", rng).group(1))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(payload) - 1}/{len(payload)}"
+            )
+        else:
+            self.send_response(200)
+        body = payload[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if type(self).drops:
+            type(self).drops -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(getla.time, "sleep", lambda s: None)
+    monkeypatch.setattr(Handler, "requests", [])
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/data.csv"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download(server, tmp_path):
+    with getla.Session() as session:
+        path = session.download(server, tmp_path / "data.csv")
+    assert path.read_bytes() == payload
+    assert Handler.requests == [None]
+
+
+def test_download_resumes(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Handler, "drops", 2)
+    with getla.Session() as session:
+        path = session.download(server, tmp_path / "data.csv")
+    assert path.read_bytes() == payload
+    assert not (tmp_path / "data.csv.part").exists()
+
+    # Each retry asks for the rest, from where the last one stopped.
+    assert Handler.requests[0] is None
+    offsets = [int(r[6:-1]) for r in Handler.requests[1:]]
+    assert len(offsets) == 2
+    assert 0 < offsets[0] < offsets[1] < len(payload)
+
+
+def test_download_range_ignored(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Handler, "drops", 1)
+    monkeypatch.setattr(Handler, "ignore_range", True)
+    with getla.Session() as session:
+        path = session.download(server, tmp_path / "data.csv")
+    assert path.read_bytes() == payload
+    assert len(Handler.requests) == 2
+
+
+def test_download_gives_up(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Handler, "drops", 3)
+    with getla.Session() as session, pytest.raises(ConnectionError):
+        session.download(server, tmp_path / "data.csv", retries=2)
+    assert not (tmp_path / "data.csv").exists()
+
+
+def write_tile(cache, index, points, size=1.0, which="mola"):
+    tdir = getla.tile_dir(cache, which, size, index)
+    tdir.mkdir(parents=True)
+    (tdir / "tile.lbl").write_text(
+        'FILE_RECORDS = 3\r\n^SPREADSHEET = "x.csv"\r\n'
+        'OBJECT = SPREADSHEET\r\n  ROWS = 2\r\nEND_OBJECT = SPREADSHEET\r\n'
+        'END\r\n'
+    )
+    (tdir / "tile.csv").write_text(
+        "LONG_EAST,LAT_NORTH,TOPOGRAPHY\n" +
+        "".join(f"{lon},{lat},{z}\n" for lon, lat, z in points)
+    )
+    return tdir
+
+
+def test_tile_indices_wrap():
+    assert getla.tile_indices(0.5, 1.5, 358.5, 1.5, 1) == [
+        (90, 358), (90, 359), (90, 0), (90, 1),
+        (91, 358), (91, 359), (91, 0), (91, 1),
+    ]
+    assert getla.tile_indices(89.5, 90, 10.5, 10.7, 1) == [(179, 10)]
+
+
+def test_assemble_edges(tmp_path):
+    # The GDS returns the points on a shared edge with both tiles.
+    edge = [(11, 0.5, 1), (11, 1, 2), (10.5, 1, 3)]
+    tdirs = [
+        write_tile(tmp_path, (90, 10), [(10.5, 0.5, 0)] + edge),
+        write_tile(tmp_path, (90, 11), [(11.5, 0.5, 4)] + edge),
+        write_tile(tmp_path, (91, 10), [(10.5, 1.5, 5)] + edge),
+        write_tile(tmp_path, (91, 11), [(11.5, 1.5, 6)] + edge),
+        write_tile(tmp_path, (179, 359), [(359.5, 90, 7), (-0.5, 89.5, 8)]),
+        write_tile(tmp_path, (179, 0), [(0, 90, 9), (360, 89.5, 10)]),
+    ]
+    output = tmp_path / "out.csv"
+    box = (-90, 90, 0, 359.99)
+    rows = getla.assemble(tdirs, box, 1.0, output)
+
+    lines = output.read_text().splitlines()
+    assert lines[0] == "LONG_EAST,LAT_NORTH,TOPOGRAPHY"
+    z = sorted(int(line.split(",")[2]) for line in lines[1:])
+    assert z == list(range(11))
+    assert rows == 11
+    label = output.with_suffix(".lbl").read_text()
+    assert "ROWS = 11" in label
+    assert "FILE_RECORDS = 12" in label
+    assert '^SPREADSHEET = "out.csv"' in label
+
+
+def test_assemble_box(tmp_path):
+    tdirs = [
+        write_tile(tmp_path, (90, 359), [(359.2, 0.5, 0), (359.8, 0.5, 1)]),
+        write_tile(tmp_path, (90, 0), [(0.2, 0.5, 2), (0.8, 0.5, 3)]),
+    ]
+    output = tmp_path / "out.csv"
+    rows = getla.assemble(tdirs, (0, 1, 359.5, 0.5), 1.0, output)
+    assert rows == 2
+    assert [line.split(",")[2] for line in output.read_text().split()[1:]] \
+        == ["1", "2"]
+
+
+def empty_tile(cache, index, size=1.0):
+    # A tile that the GDS had no data for.
+    tdir = getla.tile_dir(cache, "MOLA", size, index)
+    tdir.mkdir(parents=True)
+    (tdir / "tile.csv").touch()
+    return tdir
+
+
+def test_assemble_empty(tmp_path):
+    tdirs = [empty_tile(tmp_path, (90, 10)), empty_tile(tmp_path, (90, 11))]
+    output = tmp_path / "out.csv"
+    assert getla.assemble(tdirs, (0, 1, 10, 12), 1.0, output) == 0
+    assert not output.exists()
+    assert not output.with_suffix(".lbl").exists()
+
+    # Tiles with points, but none in the box.
+    tdirs = [write_tile(tmp_path, (90, 12), [(12.5, 0.5, 0)])]
+    assert getla.assemble(tdirs, (0, 1, 12.6, 12.9), 1.0, output) == 0
+    assert not output.exists()
+    assert not output.with_suffix(".lbl").exists()
+
+
+def test_retrieve_tiles_empty(tmp_path):
+    cache = tmp_path / "cache"
+    for index in getla.tile_indices(0.4, 0.6, 10.4, 10.6, 1.0):
+        empty_tile(cache, index)
+    output = tmp_path / "out.csv"
+    for _ in range(2):
+        assert getla.retrieve_tiles(
+            0.5, 0.5, 10.5, 10.5, "MOLA", output=output, cache=cache,
+            baseurl="http://127.0.0.1:9/"
+        ) is None
+        assert not output.exists()
+
+
+def test_batch_sites_without_points(tmp_path):
+    cache = tmp_path / "cache"
+    write_tile(cache, (90, 10), [(10.5, 0.5, 0)], which="MOLA")
+    empty_tile(cache, (90, 20))
+    results = getla.retrieve_batch(
+        [("full", "10.4/10.6/0.4/0.6"), ("empty", "20.4/20.6/0.4/0.6")],
+        "MOLA", directory=tmp_path / "out", cache=cache,
+        baseurl="http://127.0.0.1:9/"
+    )
+    assert results == [tmp_path / "out" / "full_topo_csv.csv", None]
+    assert not (tmp_path / "out" / "empty_topo_csv.csv").exists()
+
+
+def test_split_without_points(tmp_path):
+    tdir = write_tile(tmp_path, (90, 10), [(10.5, 0.5, 0), (10.7, 0.5, 1)])
+    outputs = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    rows = getla.split(
+        tdir / "tile.csv", [(0, 1, 10.4, 10.6), (0, 1, 30, 31)], outputs
+    )
+    assert rows == [1, 0]
+    assert outputs[0].with_suffix(".lbl").exists()
+    assert not outputs[1].exists()
+    assert not outputs[1].with_suffix(".lbl").exists()
+
+
+def test_batch_updates_archive_once(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    pointarchive = pytest.importorskip("pointarchive")
+
+    points = np.array(
+        [(10.5, 1.5, 3.0)],
+        dtype=[("LONGITUDE", "f8"), ("LATITUDE", "f8"), ("TOPO", "f8")]
+    )
+    updates = []
+    monkeypatch.setattr(
+        pointarchive.Archive, "update", lambda self: updates.append(self)
+    )
+    monkeypatch.setattr(
+        pointarchive.Archive, "query", lambda self, *box: points
+    )
+
+    sites = [(f"site{i}", "10/11/1/2") for i in range(5)]
+    results = getla.retrieve_batch(
+        sites, "MOLA", directory=tmp_path, archive=tmp_path / "archive"
+    )
+    assert len(updates) == 1
+    assert all(path.exists() for path in results)
+
+    # Nothing to do the second time, so no need to look at the archive.
+    getla.retrieve_batch(
+        sites, "MOLA", directory=tmp_path, archive=tmp_path / "archive"
+    )
+    assert len(updates) == 1
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import lroc
+
+
+def test_pairs():
+    left = lroc.LROCIndex(
+        ["M100000000LE", "M100000000RE", "M100000200LE", "M100009000LE"]
+    )
+    other = lroc.LROCIndex(["M100000010ME", "M100000190CE", "bad"])
+    (mine, theirs) = left.pairs(other, max_seconds=60)
+    assert mine.tolist() == [0, 1]
+    assert theirs.tolist() == [0, 1]
+    assert other.invalid.tolist() == [2]
+
+
+@pytest.mark.parametrize("ids", [[], ["not an ID"]])
+def test_pairs_with_empty(ids):
+    left = lroc.LROCIndex(["M100000000LE", "M100000200RE"])
+    empty = lroc.LROCIndex(ids)
+    for (mine, theirs) in (left.pairs(empty, 60), empty.pairs(left, 60)):
+        assert len(mine) == len(theirs) == 0
+        assert mine.dtype.kind == theirs.dtype.kind == "i"
+    with pytest.raises(ValueError):
+        empty.nearest(100000000)
+    assert np.array_equal(
+        left.nearest([99999999, 100000150])[0], [0, 1]
+    )
+
+
+def test_lrocid_without_numpy():
+    # Only the bulk functions need NumPy.
+    code = (
+        "import sys; sys.modules['numpy'] = None; import lroc; "
+        "print(lroc.lrocid('M1234567890LE').met)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        cwd=Path(lroc.__file__).parent, check=True
+    )
+    assert result.stdout.strip() == "1234567890"
@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import pds_detach  # noqa: E402
+
+
+def test_cube_without_core(tmp_path):
+    cube = tmp_path / "test.cub"
+    cube.write_bytes(
+        b"Object = IsisCube\n  Object = Core\n    Format = Tile\n"
+        b"  End_Object\nEnd_Object\nEnd\n"
+    )
+    with pytest.raises(pds_detach.UsageError, match="core"):
+        pds_detach.detach(str(cube))
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pvl")
+
+import pointarchive  # noqa: E402
+
+label = '''PDS_VERSION_ID = PDS3
+RECORD_TYPE = FIXED_LENGTH
+RECORD_BYTES = 12
+FILE_RECORDS = {rows}
+^TABLE = "{name}.dat"
+OBJECT = TABLE
+  ROWS = {rows}
+  ROW_BYTES = 12
+  COLUMNS = 3
+  INTERCHANGE_FORMAT = BINARY
+  OBJECT = COLUMN
+    NAME = LONGITUDE
+    DATA_TYPE = MSB_INTEGER
+    START_BYTE = 1
+    BYTES = 4
+    SCALING_FACTOR = 1e-6
+  END_OBJECT = COLUMN
+  OBJECT = COLUMN
+    NAME = LATITUDE
+    DATA_TYPE = MSB_INTEGER
+    START_BYTE = 5
+    BYTES = 4
+    SCALING_FACTOR = 1e-6
+  END_OBJECT = COLUMN
+  OBJECT = COLUMN
+    NAME = TOPO
+    DATA_TYPE = IEEE_REAL
+    START_BYTE = 9
+    BYTES = 4
+  END_OBJECT = COLUMN
+END_OBJECT = TABLE
+END
+'''
+
+record = np.dtype([("lon", ">i4"), ("lat", ">i4"), ("topo", ">f4")])
+
+
+def write_table(directory, name, lon, lat):
+    table = np.empty(len(lon), dtype=record)
+    table["lon"] = np.round(np.asarray(lon) * 1e6)
+    table["lat"] = np.round(np.asarray(lat) * 1e6)
+    table["topo"] = np.arange(len(lon))
+    table.tofile(directory / f"{name}.dat")
+    (directory / f"{name}.lbl").write_text(
+        label.format(rows=len(lon), name=name)
+    )
+
+
+@pytest.fixture
+def archive(tmp_path):
+    rng = np.random.default_rng(36)
+    for i in range(3):
+        write_table(
+            tmp_path, f"t{i}", rng.uniform(0, 360, 500),
+            rng.uniform(-90, 90, 500)
+        )
+    return pointarchive.Archive(tmp_path)
+
+
+def test_query(archive):
+    assert archive.update()
+    points = archive.query(-10, 20, 350, 30)
+    assert 0 < len(points) < 1500
+    lon = points["LONGITUDE"] % 360
+    assert np.all((lon >= 350) | (lon <= 30))
+    assert np.all((points["LATITUDE"] >= -10) & (points["LATITUDE"] <= 20))
+
+
+def test_update_reads_only_changed_labels(archive, monkeypatch):
+    assert archive.update()
+    loads = []
+    real_load = pointarchive.pvl.load
+    monkeypatch.setattr(
+        pointarchive.pvl, "load",
+        lambda path, **kw: loads.append(path) or real_load(path, **kw)
+    )
+    assert archive.is_current()
+    assert not archive.update()
+    assert loads == []
+
+    # A changed table is noticed without reading its label.
+    table = archive.directory / "t1.dat"
+    st = table.stat()
+    os.utime(table, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert not archive.is_current()
+    assert loads == []
+
+    label_path = archive.directory / "t2.lbl"
+    st = label_path.stat()
+    os.utime(label_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    loads.clear()
+    assert not archive.is_current()
+    assert loads == [str(label_path)]
+
+
+def test_build_sorted_runs(tmp_path):
+    # Points clustered in one small area, spread over several tables, and
+    # merged from many runs.
+    rng = np.random.default_rng(0)
+    lons, lats = list(), list()
+    for i in range(4):
+        lon = rng.uniform(137.0, 137.01, 2000)
+        lat = rng.uniform(-4.6, -4.59, 2000)
+        write_table(tmp_path, f"t{i}", lon, lat)
+        lons.append(lon)
+        lats.append(lat)
+    archive = pointarchive.Archive(tmp_path)
+    archive.build(chunk_rows=700)
+
+    keys = np.load(pointarchive.topo2npy.keys_path(archive.points_path))
+    points = np.load(archive.points_path)
+    assert len(points) == len(keys) == 8000
+    assert np.all(np.diff(keys.astype(np.int64)) >= 0)
+    assert np.array_equal(
+        keys,
+        pointarchive.topo2npy.morton(points["LONGITUDE"], points["LATITUDE"])
+    )
+    assert np.allclose(
+        np.sort(points["LONGITUDE"]), np.sort(np.concatenate(lons)),
+        atol=1e-6
+    )
+
+
+def test_build_empty(tmp_path):
+    write_table(tmp_path, "t0", [], [])
+    with pytest.raises(ValueError, match="any points"):
+        pointarchive.Archive(tmp_path).build()
+    assert not (tmp_path / ".index" / "runs").exists()
+
+
+def test_labels_without_tables(archive):
+    (archive.directory / "catalog.lbl").write_text(
+        "PDS_VERSION_ID = PDS3\n"
+        "OBJECT = DATA_SET\n  DATA_SET_ID = \"TEST\"\nEND_OBJECT = DATA_SET\n"
+        "END\n"
+    )
+    (archive.directory / "document").mkdir()
+    (archive.directory / "document" / "guide.lbl").write_text(
+        "PDS_VERSION_ID = PDS3\n^TEXT = \"guide.txt\"\n"
+        "OBJECT = TEXT\n  NOTE = \"A guide\"\nEND_OBJECT = TEXT\nEND\n"
+    )
+    assert archive.update()
+    assert len(archive.query(-90, 90, 0, 360)) == 1500
+    assert not archive.update()
+
+
+def test_no_tables(tmp_path):
+    (tmp_path / "catalog.lbl").write_text(
+        "PDS_VERSION_ID = PDS3\nOBJECT = DATA_SET\nEND_OBJECT = DATA_SET\n"
+        "END\n"
+    )
+    with pytest.raises(ValueError, match="No PDS3 labels of tables"):
+        pointarchive.Archive(tmp_path).update()
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("pvl")
+
+import readlabel  # noqa: E402
+
+label = (
+    b"Object = IsisCube\n"
+    b"  Object = Core\n"
+    b"    StartByte = 65537\n"
+    b"    Group = Dimensions\n"
+    b"      Samples = 3\n"
+    b"    End_Group\n"
+    b"  End_Object\n"
+    b"End_Object\n"
+    b"End\n"
+)
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n"])
+def test_end_across_chunks(tmp_path, newline):
+    text = label.replace(b"\n", newline)
+    path = tmp_path / "test.cub"
+    path.write_bytes(text + b"\0" * 100 + b"pixels")
+
+    # Every place a chunk can end, including just after the End of each
+    # End_Group and End_Object.
+    for chunk_size in range(1, len(text) + 2):
+        assert readlabel.label_bytes(path, chunk_size=chunk_size) == text
+    assert readlabel.read_label(path, chunk_size=7)["IsisCube"]["Core"][
+        "Dimensions"
+    ]["Samples"] == 3
+
+
+def test_end_at_default_chunk(tmp_path):
+    # The End of End_Object is the last thing in the first 64 KiB chunk.
+    lines = label.split(b"\n")
+    head = b"\n".join(lines[:7]) + b"\n"
+    pad = b"/* " + b"x" * (65536 - len(head) - len(b"End") - 7) + b" */\n"
+    text = head + pad + b"End" + b"_Object\nEnd\n"
+    assert text.index(b"End_Object\nEnd") + 3 == 65536
+    path = tmp_path / "test.cub"
+    path.write_bytes(text + b"\0" * 65536)
+    assert readlabel.label_bytes(path) == text
+    assert "IsisCube" in readlabel.read_label(path)
+
+
+def test_end_at_end_of_file(tmp_path):
+    path = tmp_path / "test.lbl"
+    path.write_bytes(label.rstrip())
+    assert readlabel.label_bytes(path, chunk_size=16) == label.rstrip()
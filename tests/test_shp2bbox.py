@@ -0,0 +1,131 @@
+import json
+import math
+import sys
+
+import pytest
+
+pytest.importorskip("osgeo")
+geographiclib = pytest.importorskip("geographiclib.geodesic")
+
+import shp2bbox  # noqa: E402
+
+squares = [
+    [(10, 10), (12, 10), (12, 13), (10, 13), (10, 10)],
+    [(-50, 60), (-40, 60), (-40, 70), (-50, 70), (-50, 60)],
+    [(170, -5), (179, -5), (179, 5), (170, 5), (170, -5)],
+]
+
+
+def baseline_haversine(lon1, lat1, lon2, lat2, radius):
+    # The haversine() that shp2bbox used to have, one pair at a time.
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlam = math.radians(lon2 - lon1)
+    h = math.sin(dphi / 2) ** 2 + (
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    )
+    return radius * 2 * math.atan2(math.sqrt(h), math.sqrt(1 - h))
+
+
+@pytest.fixture
+def geojson(tmp_path):
+    path = tmp_path / "squares.geojson"
+    path.write_text(json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"Name": f"sq{i}", "Descriptor": "square"},
+                "geometry": {"type": "Polygon", "coordinates": [ring]}
+            }
+            for i, ring in enumerate(squares)
+        ]
+    }))
+    return path
+
+
+def run_main(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["shp2bbox.py", *argv])
+    assert shp2bbox.main() in (0, None)
+    return capsys.readouterr().out.splitlines()
+
+
+@pytest.mark.parametrize("mode", [[], ["--stream"]])
+def test_distances_match_baseline(monkeypatch, capsys, geojson, mode):
+    lines = run_main(monkeypatch, capsys, "-d", "6", *mode, str(geojson))
+    haver = [float(x.split()[2]) for x in lines if x.startswith("Haversine")]
+    geo = [float(x.split()[2]) for x in lines if x.startswith("Geodesic")]
+    assert len(haver) == len(geo) == len(squares)
+
+    # The longest dimension of each square is one of its diagonals.
+    wgs84 = geographiclib.Geodesic.WGS84
+    for ring, h, g in zip(squares, haver, geo):
+        (lon1, lat1), (lon2, lat2) = ring[0], ring[2]
+        diag_g = [
+            wgs84.Inverse(p[1], p[0], q[1], q[0])["s12"]
+            for p, q in ((ring[0], ring[2]), (ring[1], ring[3]))
+        ]
+        diag_h = [
+            baseline_haversine(*p, *q, wgs84.a)
+            for p, q in ((ring[0], ring[2]), (ring[1], ring[3]))
+        ]
+        assert any(h == pytest.approx(d / 1000, abs=1e-6) for d in diag_h)
+        assert any(g == pytest.approx(d / 1000, abs=1e-6) for d in diag_g)
+
+
+def test_output_independent_of_batch(monkeypatch, capsys, geojson):
+    default = run_main(monkeypatch, capsys, str(geojson))
+    streamed = run_main(monkeypatch, capsys, "--stream", str(geojson))
+    assert default == streamed
+
+
+def test_report_streams(capsys):
+    args = type("Args", (), {"decimals": 2})()
+    printed = []
+
+    def records():
+        for i in range(5):
+            printed.extend(capsys.readouterr().out.splitlines())
+            # Everything from the batches before this one is already out.
+            assert printed.count("Geodesic dist: 0.00 km") == i - i % 2
+            yield dict(
+                lines=[f"feature {i}"], pair=(0, 0, 0, 0), a=1.0, b=1.0
+            )
+
+    shp2bbox.report(records(), args, batch=2)
+    printed.extend(capsys.readouterr().out.splitlines())
+    assert [x for x in printed if x.startswith("feature")] == [
+        f"feature {i}" for i in range(5)
+    ]
+
+
+def test_curve_geometry(capsys):
+    from osgeo import ogr, osr
+
+    srs = osr.SpatialReference()
+    srs.ImportFromProj4("+proj=longlat +a=3396190 +b=3376200")
+    layer = ogr.GetDriverByName("Memory").CreateDataSource("").CreateLayer(
+        "curves", srs
+    )
+    layer.CreateField(ogr.FieldDefn("Name", ogr.OFTString))
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetField("Name", "circle")
+    feature.SetGeometry(ogr.CreateGeometryFromWkt(
+        "CURVEPOLYGON (CIRCULARSTRING (0 -1, 1 0, 0 1, -1 0, 0 -1))"
+    ))
+    layer.CreateFeature(feature)
+    args = type(
+        "Args", (), {"decimals": 2, "lon360": False, "parameters": True,
+                     "exact": False}
+    )()
+
+    results = [
+        shp2bbox.measure(f, layer, args, buffer)
+        for buffer in (None, shp2bbox.CoordinateBuffer())
+        for f in (layer.GetFeature(feature.GetFID()),)
+    ]
+    assert results[0]["lines"] == results[1]["lines"]
+    area = float(results[0]["lines"][-3].split()[1])
+    radius = math.radians(1) * 3396190 / 1000
+    assert area == pytest.approx(math.pi * radius ** 2, rel=0.01)
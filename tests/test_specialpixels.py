@@ -0,0 +1,142 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pvl")
+
+import specialpixels  # noqa: E402
+
+numpy_types = {
+    "UnsignedByte": "u1",
+    "SignedWord": "i2",
+    "UnsignedWord": "u2",
+    "SignedInteger": "i4",
+    "UnsignedInteger": "u4",
+    "Real": "f4",
+}
+
+
+def write_cube(
+    path, image, pixel_type, byte_order, fmt, tile=16, detached=False
+):
+    """Writes the (bands, lines, samples) *image* as an ISIS cube with an
+    attached label, padding the tiles on the edges with zeros.  If
+    *detached*, the label is written to *path* and the pixels to a file
+    next to it with a .core suffix."""
+    bands, lines, samples = image.shape
+    start = 65537
+    tiles = f"    TileSamples = {tile}\n    TileLines = {tile}\n"
+    if detached:
+        core = (
+            f"  ^Core = {Path(path).with_suffix('.core').name}\n"
+            "  Object = Core\n"
+        )
+    else:
+        core = f"  Object = Core\n    StartByte = {start}\n"
+    label = f"""Object = IsisCube
+{core}    Format = {fmt}
+{tiles if fmt == "Tile" else ""}
+    Group = Dimensions
+      Samples = {samples}
+      Lines = {lines}
+      Bands = {bands}
+    End_Group
+
+    Group = Pixels
+      Type = {pixel_type}
+      ByteOrder = {byte_order}
+      Base = 0.0
+      Multiplier = 1.0
+    End_Group
+  End_Object
+End_Object
+End
+""".encode()
+
+    if fmt == "Tile":
+        rows = -(-lines // tile)
+        cols = -(-samples // tile)
+        padded = np.zeros((bands, rows * tile, cols * tile), image.dtype)
+        padded[:, :lines, :samples] = image
+        image = padded.reshape(bands, rows, tile, cols, tile).transpose(
+            0, 1, 3, 2, 4
+        )
+    dtype = image.dtype.newbyteorder("<" if byte_order == "Lsb" else ">")
+    data = np.ascontiguousarray(image).astype(dtype).tobytes()
+    if detached:
+        Path(path).write_bytes(label)
+        Path(path).with_suffix(".core").write_bytes(data)
+        return
+    with open(path, "wb") as f:
+        f.write(label.ljust(start - 1, b"\0"))
+        f.write(data)
+
+
+def random_image(pixel_type, shape=(2, 40, 37)):
+    rng = np.random.default_rng(42)
+    t = numpy_types[pixel_type]
+    if t == "f4":
+        return rng.normal(size=shape).astype(t)
+    return rng.integers(3, 200 if t == "u1" else 30000, size=shape).astype(t)
+
+
+cases = [
+    (pixel_type, kind)
+    for pixel_type, (size, specials) in specialpixels.special_values.items()
+    for kind in (None, *specials)
+]
+
+
+@pytest.mark.parametrize("byte_order", ["Lsb", "Msb"])
+@pytest.mark.parametrize("fmt", ["BandSequential", "Tile"])
+@pytest.mark.parametrize("pixel_type,kind", cases)
+def test_first_special(tmp_path, pixel_type, kind, byte_order, fmt):
+    image = random_image(pixel_type)
+    size, specials = specialpixels.special_values[pixel_type]
+    if kind is not None:
+        image.view(f"u{size}")[1, 33, 35] = specials[kind]
+
+    path = tmp_path / "test.cub"
+    write_cube(path, image, pixel_type, byte_order, fmt)
+    found = specialpixels.first_special(path, block_bytes=1000)
+    assert found == (None if kind is None else (kind, 36, 34, 2))
+
+
+def test_bands_in_order(tmp_path):
+    image = random_image("SignedWord")
+    raw = image.view("u2")
+    raw[1, 0, 0] = 0x8003
+    raw[0, 39, 36] = 0x8001
+    path = tmp_path / "test.cub"
+    write_cube(path, image, "SignedWord", "Lsb", "BandSequential")
+    assert specialpixels.first_special(path, block_bytes=64) == (
+        "Lrs", 37, 40, 1
+    )
+
+
+def test_tile_padding_ignored(tmp_path):
+    # Tiles of 16 on a 40 by 37 image leave padding past the edges, where
+    # a special value isn't a pixel of the image.
+    image = np.full((1, 40, 37), 5, dtype="u2")
+    path = tmp_path / "test.cub"
+    write_cube(path, image, "UnsignedWord", "Lsb", "Tile")
+    tiles, specials = specialpixels.core_array(path)
+    assert tiles.shape == (1, 3, 3, 16, 16)
+
+    with open(path, "r+b") as f:
+        f.seek(0, 2)
+        f.seek(f.tell() - 2)
+        f.write(specials["Hrs"].to_bytes(2, "little"))
+    assert specialpixels.first_special(path) is None
+
+
+@pytest.mark.parametrize("fmt", ["BandSequential", "Tile"])
+def test_detached(tmp_path, fmt):
+    image = random_image("Real")
+    image.view("u4")[0, 20, 30] = specialpixels.special_values["Real"][1][
+        "His"
+    ]
+    path = tmp_path / "test.lbl"
+    write_cube(path, image, "Real", "Lsb", fmt, detached=True)
+    assert specialpixels.first_special(path) == ("His", 31, 21, 1)
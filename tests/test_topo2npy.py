@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("pvl")
+
+import topo2npy  # noqa: E402
+
+label = '''PDS_VERSION_ID = PDS3
+OBJECT = SPREADSHEET
+  OBJECT = FIELD
+    Name = "longitude"
+    DATA_TYPE = ASCII_REAL
+  END_OBJECT = FIELD
+  OBJECT = FIELD
+    Name = "latitude"
+    DATA_TYPE = ascii_real
+  END_OBJECT = FIELD
+  OBJECT = FIELD
+    NAME = "Shot"
+    DATA_TYPE = ASCII_INTEGER
+  END_OBJECT = FIELD
+  OBJECT = FIELD
+    NAME = "Mode"
+    DATA_TYPE = CHARACTER
+    BYTES = 4
+  END_OBJECT = FIELD
+END_OBJECT = SPREADSHEET
+END
+'''
+
+
+def test_label_dtype_ignores_case(tmp_path):
+    path = tmp_path / "points.lbl"
+    path.write_text(label)
+    dtype = topo2npy.label_dtype(path, "LONGITUDE,Latitude,SHOT,mode,Z")
+    assert dtype.names == ("LONGITUDE", "Latitude", "SHOT", "mode", "Z")
+    assert [dtype[n].str for n in dtype.names] == [
+        "<f8", "<f8", "<i8", "<U4", "<f8"
+    ]
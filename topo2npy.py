@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""Converts a MOLA or LOLA topography CSV file from the PDS Geosciences
+Node's GDS (like those that getla.py retrieves) into a spatially sorted
+NumPy .npy file, which can be memory-mapped and have the points in a
+longitude/latitude box read from it without a scan of the whole file.
+If a W/E/S/N box is given, prints the points in that box from an
+already-converted file as CSV."""
+
+# Copyright 2026, Ross A. Beyer (rbeyer@seti.org)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The .npy file holds a structured array with one field per column of
+# the CSV, typed from the FIELD (or COLUMN) objects of the companion
+# PDS3 label.  The rows are sorted by the Morton (Z-order) key of each
+# point's longitude (0 to 360) and latitude, quantized to 2^16 steps
+# each, and those keys are written, in order, to a .keys.npy file
+# beside it.  Every cell of a quadtree over the globe is then one
+# contiguous run of rows, so the points in a box are found by splitting
+# the box into quadtree cells and binary searching the memory-mapped
+# keys for the run of each cell, which only touches a few pages of
+# them.
+#
+# A small JSON file beside the .npy file records which fields are the
+# longitude and latitude.
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pvl
+
+bits = 16
+
+# How PDS3 DATA_TYPEs of text tables are stored.
+data_types = dict(
+    ASCII_REAL="f8",
+    ASCII_INTEGER="i8",
+    ASCII_UNSIGNED_INTEGER="u8",
+)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+    )
+    parser.add_argument(
+        "-l", "--label",
+        type=Path,
+        help="The PDS3 label of the CSV file.  Default is the CSV file "
+             "name with a .lbl suffix."
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=Path,
+        help="The .npy file to write.  Default is the CSV file name with "
+             "a .npy suffix."
+    )
+    parser.add_argument(
+        "-b", "--box",
+        help="A W/E/S/N string.  If given, the input file should be a .npy "
+             "file made by this program, and the points in the box are "
+             "printed."
+    )
+    parser.add_argument(
+        "file",
+        type=Path,
+        help="A topo CSV file to convert, or a .npy file to read."
+    )
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    args = parser.parse_args()
+
+    if args.box is None:
+        convert(args.file, args.label, args.output)
+    else:
+        west, east, south, north = (float(x) for x in args.box.split("/"))
+        points = read_box(args.file, south, north, west, east)
+        write_csv(points, sys.stdout)
+
+
+def label_dtype(label_path, header):
+    """Returns a NumPy structured dtype for the columns of the CSV file
+    described by the PDS3 label at *label_path*, in the order of the
+    names in the CSV *header* line.  Names and keywords are matched
+    without regard to case."""
+    names = [n.strip().strip('"') for n in header.split(",")]
+    types = dict()
+    if label_path is not None and Path(label_path).exists():
+        label = pvl.load(str(label_path))
+        for obj in label.values():
+            if not isinstance(obj, dict):
+                continue
+            for key, field in obj.items():
+                if key.upper() in ("FIELD", "COLUMN"):
+                    field = {k.upper(): v for k, v in field.items()}
+                    types[str(field["NAME"]).upper()] = data_types.get(
+                        str(field.get("DATA_TYPE")).upper(),
+                        f"U{field.get('BYTES', 32)}"
+                    )
+
+    # Any column the label doesn't describe is assumed to be a number.
+    return np.dtype([(n, types.get(n.upper(), "f8")) for n in names])
+
+
+def lonlat_names(names):
+    """Returns a two-tuple of the longitude and latitude field names from
+    the list of *names*."""
+    try:
+        lon = next(n for n in names if "lon" in n.casefold())
+        lat = next(n for n in names if "lat" in n.casefold())
+    except StopIteration:
+        raise ValueError(f"Could not find longitude and latitude in {names}")
+    return lon, lat
+
+
+def _part1by1(x):
+    # Spreads the low 16 bits of x out to the even bits.
+    x = x.astype(np.uint32) & 0x0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    return x
+
+
+def quantize(lon, lat):
+    """Returns two-tuple of arrays of the integer cell x and y of the
+    longitudes and latitudes."""
+    n = 2 ** bits
+    x = np.floor(np.mod(lon, 360) / 360 * n).astype(np.int64)
+    y = np.floor((np.asarray(lat) + 90) / 180 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def morton(lon, lat):
+    """Returns an array of the Morton keys of the longitudes and
+    latitudes."""
+    x, y = quantize(lon, lat)
+    return _part1by1(x) | (_part1by1(y) << 1)
+
+
+def convert(csv_path, label_path=None, output=None, chunk_rows=1000000):
+    """Writes the points of the CSV file to a spatially sorted .npy file,
+    and returns its path.  The CSV file is parsed *chunk_rows* at a time,
+    into a memory-mapped file, so the points never all need to be in
+    memory as text or Python objects."""
+    csv_path = Path(csv_path)
+    if label_path is None:
+        label_path = csv_path.with_suffix(".lbl")
+    if output is None:
+        output = csv_path.with_suffix(".npy")
+    output = Path(output)
+
+    with open(csv_path, newline="") as f:
+        header = f.readline()
+        rows = sum(1 for line in f if line.strip())
+
+    dtype = label_dtype(label_path, header)
+    lon_name, lat_name = lonlat_names(dtype.names)
+
+    unsorted_path = output.with_name(output.name + ".unsorted")
+    points = np.lib.format.open_memmap(
+        unsorted_path, mode="w+", dtype=dtype, shape=(rows,)
+    )
+    keys = np.empty(rows, dtype=np.uint32)
+    start = 0
+    for chunk in read_csv(csv_path, label_path, chunk_rows):
+        stop = start + len(chunk)
+        points[start:stop] = chunk
+        keys[start:stop] = morton(chunk[lon_name], chunk[lat_name])
+        start = stop
+
+    order = np.argsort(keys, kind="stable")
+    np.save(keys_path(output), keys[order])
+    del keys
+    sorted_points = np.lib.format.open_memmap(
+        output, mode="w+", dtype=dtype, shape=(rows,)
+    )
+    # One field at a time, to bound the memory needed.
+    for name in dtype.names:
+        sorted_points[name] = points[name][order]
+    sorted_points.flush()
+    del points, sorted_points
+    unsorted_path.unlink()
+
+    output.with_suffix(".json").write_text(
+        json.dumps(dict(lon=lon_name, lat=lat_name, bits=bits))
+    )
+    return output
+
+
+def read_csv(csv_path, label_path=None, chunk_rows=1000000):
+    """Yields structured arrays of up to *chunk_rows* points at a time
+    from the CSV file, typed by label_dtype()."""
+    csv_path = Path(csv_path)
+    if label_path is None:
+        label_path = csv_path.with_suffix(".lbl")
+    with open(csv_path, newline="") as f:
+        dtype = label_dtype(label_path, f.readline())
+        while True:
+            lines = [
+                line for line in itertools.islice(f, chunk_rows) if line.strip()
+            ]
+            if not lines:
+                return
+            yield np.loadtxt(
+                lines, delimiter=",", dtype=dtype, ndmin=1,
+                converters=lambda s: s.strip()
+            )
+
+
+def keys_path(npy_path):
+    """Returns the path of the Morton keys file of the .npy file."""
+    npy_path = Path(npy_path)
+    return npy_path.with_name(npy_path.stem + ".keys.npy")
+
+
+def _cell_ranges(xmin, xmax, ymin, ymax, max_cells=64):
+    # Returns a list of (low, high) Morton key ranges which cover the
+    # box of cell coordinates xmin..xmax, ymin..ymax (inclusive), by
+    # descending a quadtree until cells are within the box, or until
+    # there are enough cells that descending further isn't worth it.
+    ranges = list()
+    cells = [(0, 0, bits)]  # x, y, and level (cell size is 2^level)
+    while cells:
+        refine = len(ranges) + len(cells) < max_cells
+        next_cells = list()
+        for x, y, level in cells:
+            size = 2 ** level
+            if x > xmax or x + size - 1 < xmin or y > ymax or y + size - 1 < ymin:
+                continue
+            inside = (
+                xmin <= x and x + size - 1 <= xmax and
+                ymin <= y and y + size - 1 <= ymax
+            )
+            if inside or level == 0 or not refine:
+                low = int(morton_cell(x, y))
+                ranges.append((low, low + size * size - 1))
+            else:
+                half = size // 2
+                next_cells.extend(
+                    (x + dx, y + dy, level - 1)
+                    for dy in (0, half) for dx in (0, half)
+                )
+        cells = next_cells
+
+    # Merge the ranges which abut.
+    ranges.sort()
+    merged = list()
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def morton_cell(x, y):
+    return (
+        _part1by1(np.asarray(x)) | (_part1by1(np.asarray(y)) << 1)
+    ).item()
+
+
+def read_box(npy_path, minlat, maxlat, westlon, eastlon):
+    """Returns a structured array of the points in the .npy file made by
+    convert() which are within the box.  If *westlon* is greater than
+    *eastlon* (after both are put in the range 0 to 360), the box crosses
+    the 0/360 meridian."""
+    npy_path = Path(npy_path)
+    meta = json.loads(npy_path.with_suffix(".json").read_text())
+    points = np.load(npy_path, mmap_mode="r")
+    keys = np.load(keys_path(npy_path), mmap_mode="r")
+
+    if eastlon - westlon >= 360:
+        lon_spans = [(0, 360)]
+    else:
+        westlon %= 360
+        eastlon %= 360
+        if eastlon == 0:
+            eastlon = 360
+        if westlon <= eastlon:
+            lon_spans = [(westlon, eastlon)]
+        else:
+            lon_spans = [(westlon, 360), (0, eastlon)]
+
+    (ymin, ymax) = quantize(0, np.array([minlat, maxlat]))[1]
+    ranges = list()
+    for west, east in lon_spans:
+        xmin, xmax = quantize(np.array([west, min(east, 360 - 1e-9)]), 0)[0]
+        ranges.extend(_cell_ranges(xmin, xmax, ymin, ymax))
+    if not ranges:
+        return np.empty(0, dtype=points.dtype)
+
+    low, high = np.array(ranges, dtype=np.uint32).T
+    starts = np.searchsorted(keys, low, side="left")
+    stops = np.searchsorted(keys, high, side="right")
+    pieces = [
+        np.asarray(points[start:stop])
+        for start, stop in zip(starts, stops) if stop > start
+    ]
+    if not pieces:
+        return np.empty(0, dtype=points.dtype)
+
+    found = np.concatenate(pieces)
+    lon = np.mod(found[meta["lon"]], 360)
+    lat = found[meta["lat"]]
+    in_lon = np.zeros(len(found), dtype=bool)
+    for west, east in lon_spans:
+        in_lon |= (lon >= west) & (lon <= east)
+    return found[in_lon & (lat >= minlat) & (lat <= maxlat)]
+
+
+def write_csv(points, f):
+    """Writes the structured array of *points* from read_box() as CSV to
+    the file object *f*."""
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(points.dtype.names)
+    for row in points.tolist():
+        writer.writerow(row)
+
+
+def write_label(points, csv_path):
+    """Writes a PDS3 label, like those of the GDS topo CSV files, for the
+    CSV file at *csv_path* that write_csv() wrote the *points* to, and
+    returns its path."""
+    csv_path = Path(csv_path)
+    kinds = dict(f="ASCII_REAL", i="ASCII_INTEGER", u="ASCII_INTEGER")
+    lines = [
+        "PDS_VERSION_ID = PDS3",
+        "RECORD_TYPE = STREAM",
+        f"FILE_RECORDS = {len(points) + 1}",
+        f'^SPREADSHEET = "{csv_path.name}"',
+        "OBJECT = SPREADSHEET",
+        f"  ROWS = {len(points)}",
+        f"  FIELDS = {len(points.dtype.names)}",
+        '  FIELD_DELIMITER = "COMMA"',
+    ]
+    for i, name in enumerate(points.dtype.names, start=1):
+        if len(points):
+            width = int(np.char.str_len(points[name].astype(str)).max())
+        else:
+            width = 1
+        lines += [
+            "  OBJECT = FIELD",
+            f"    NAME = {name}",
+            f"    FIELD_NUMBER = {i}",
+            f"    DATA_TYPE = {kinds.get(points.dtype[name].kind, 'CHARACTER')}",
+            f"    BYTES = {width}",
+            "  END_OBJECT = FIELD",
+        ]
+    lines += ["END_OBJECT = SPREADSHEET", "END"]
+
+    label_path = csv_path.with_suffix(".lbl")
+    label_path.write_text("\r\n".join(lines) + "\r\n")
+    return label_path
+
+
+if __name__ == "__main__":
+    sys.exit(main())